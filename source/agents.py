@@ -1,7 +1,13 @@
 import agentpy as ap
 import numpy as np
-import math
 from ast import literal_eval
+from agentpy.tools import make_list
+from rules import RuleTable, FIELDS, BITCOUNT, CONSTANTCARE, CONSTANTVALUE
+
+
+def triggerFires(gARandInt, forecastAdaptation: int):
+    """returning whether the genetic algorithm fires for trigger integers in [0, 1000)"""
+    return gARandInt < 4 if forecastAdaptation else gARandInt == 0
 
 
 class MarketStatistician(ap.Agent):
@@ -11,6 +17,11 @@ class MarketStatistician(ap.Agent):
         self.rules = self.initializeRules(
             numRules=self.model.p.M
         )  # initializing set of rules for the agent
+        if (
+            self.model.p.defaultPredictor == "separate"
+            and self.model.checkpoint is None
+        ):
+            self.rules.refreshDefault()  # averaging all rules into the default predictor outside the table
         (
             self.currentRule,
             self.activeRules,
@@ -60,17 +71,11 @@ class MarketStatistician(ap.Agent):
         self.errorVarianceUpdate()  # updating the errorVariance of the previously active predictors
         self.prevForecastUpdate()  # updating the previous forecast of the previously active predictors
 
-        # genetic algorithm random generators, conditions, and variables
-        self.gARandom = self.model.randomGenerator()
-        gARandInt = self.gARandom.integers(1000)
-        gACondition = ((self.model.p.forecastAdaptation) & (gARandInt < 4)) | (
-            (not self.model.p.forecastAdaptation) & (gARandInt == 0)
-        )
-        if gACondition:
-            self.geneticAlgorithm()
+        self.geneticAlgorithmTrigger()  # performing the genetic algorithm with regime specific probability
 
         self.utility = self.utilityCalc()
 
+        self.model.aggregatedVolume += abs(self.position - self.demand)
         # cash calculation with taxation based on Ehrentreich (2008) to prevent wealth explosion
         self.cash -= (self.demand - self.position) * self.model.price
         self.cash = self.cash + self.position * (
@@ -79,29 +84,66 @@ class MarketStatistician(ap.Agent):
         self.position = self.demand
         self.wealth = self.cash + self.position * self.model.price
 
+    def geneticAlgorithmTrigger(self: ap.Agent):
+        """performing the genetic algorithm with probability 4/1000 (fast) or 1/1000 (slow)"""
+        if self.model.rng.legacy:
+            # a new generator per call, which the genetic algorithm draws from as well
+            self.gARandom = self.model.rng.generator("geneticAlgorithm", self.id)
+            gARandInt = self.gARandom.integers(1000)
+        else:
+            gARandInt = self.model.rng.block("trigger", self.id, high=1000).next()
+        if triggerFires(gARandInt, self.model.p.forecastAdaptation):
+            self.evolveRules()
+
+    def evolveRules(self: ap.Agent):
+        """performing the genetic algorithm once its trigger fired"""
+        if not self.model.rng.legacy:
+            self.gARandom = self.model.rng.generator("geneticAlgorithm", self.id)
+        with self.model.profiler.phase("geneticAlgorithm"):
+            if self.model.rng.legacy:
+                self.geneticAlgorithm()
+            else:
+                self.batchedGeneticAlgorithm()
+            if self.model.p.defaultPredictor == "separate":
+                # averaging the changed fitness and predictors into the default predictor
+                self.rules.refreshDefault()
+
     def document(self: ap.Agent):
         """documenting relevant variables of agents"""
-        self.record(
-            "bitsUsed",
-            sum(
-                [
-                    4
-                    - [
-                        self.rules[rule]["condition"].get(i) for i in range(7, 11)
-                    ].count(None)
-                    for rule in self.rules
-                ]
-            ),
-        )
+        # numbers of technical, fundamental, and all specified bits used by all rules
+        (
+            self.bitsUsed,
+            self.fundamentalBitsUsed,
+            self.specificity,
+        ) = self.rules.counts.tolist()
+        self.record(["bitsUsed", "fundamentalBitsUsed", "specificity"])
         self.record(["forecast", "demand", "cash", "wealth", "position", "utility"])
 
+    def record(self: ap.Agent, var_keys, value=None):
+        """recording variables of the agent in the columns of the model's recorder"""
+        for key in make_list(var_keys):
+            self.model.recorder.recordAgent(
+                self.model.t,
+                self.id,
+                key,
+                getattr(self, key) if value is None else value,
+            )
+
     def end(self: ap.Agent):
         """documenting agent's set of predictors at the end of the simulation"""
-        self.record(["rules"])
+        # rules are python objects and kept in the agent's log instead of the recorder
+        if self.model.recorder.recording("rules"):
+            super().record("rules", self.rules.toDict())
 
-    def initializeRules(self: ap.Agent, numRules: int) -> dict:
+    def initializeRules(self: ap.Agent, numRules: int) -> RuleTable:
         """initializing dict of rules with respective predictive bitstring rules"""
-        if self.model.p.mode == 3 and self.model.t == 0:
+        if self.model.p.mode == 3 and self.model.checkpoint is not None:
+            # importing rules from the checkpoint of a previous run
+            return self.model.checkpointRules(self.id)
+        elif self.model.p.mode == 3 and self.model.importedStore is not None:
+            # importing rules from the compact store of a previous experiment
+            return self.model.storedRules(self.id)
+        elif self.model.p.mode == 3 and self.model.t == 0:
             if self.model._run_id[0] != None:
                 # importing rules from pre-trained model for each type of forecastAdaptation (experiment)
                 d = literal_eval(
@@ -125,12 +167,15 @@ class MarketStatistician(ap.Agent):
                     .iloc[-1]
                     .rules
                 )
-        else:
-            # creating new rules
+        elif self.model.rng.legacy:
+            # creating new rules one by one
             d = {}
             for i in range(1, numRules + 1):
                 d[i] = self.createRule()
-        return d
+        else:
+            # creating new rules at once
+            return self.createRules(numRules=numRules)
+        return RuleTable.fromDict(d, numRules=numRules)
 
     def addPrevForecast(self: ap.Agent, d: dict, pt: float, dt: float):
         """adding previous forecast to imported rules"""
@@ -141,7 +186,7 @@ class MarketStatistician(ap.Agent):
 
     def createRule(self: ap.Agent) -> dict:
         """creating dict of predictive bitstring rule with respective predictor and observatory meassures"""
-        self.ruleRandom = self.model.randomGenerator()
+        self.ruleRandom = self.model.rng.generator("rules", self.id)
         constantConditions = {11: 1, 12: 0}
         variableConditions = {
             i: (1 if j < 10 else 0 if 10 <= j < 20 else None)
@@ -163,58 +208,52 @@ class MarketStatistician(ap.Agent):
             "prevForecast": 110,
         }
 
-    def activateRules(self: ap.Agent) -> tuple[int, list]:
-        """activating the rules matching the models worldState and returning a list reflecting the keys"""
-        activeRuleKeys = []
+    def createRules(self: ap.Agent, numRules: int) -> RuleTable:
+        """creating a table of predictive bitstring rules with the random numbers of all rules drawn at once"""
+        self.ruleRandom = self.model.rng.generator("rules", self.id)
+        table = RuleTable(numRules=numRules)
+        rules = slice(0, numRules)  # all rules except the default rule
+        conditionRandInts = self.ruleRandom.integers(0, 100, (numRules, 10))
+        bits = 1 << np.arange(10)
+        table.setCondition(
+            np.arange(numRules),
+            ((conditionRandInts < 20) * bits).sum(axis=1) | CONSTANTCARE,
+            ((conditionRandInts < 10) * bits).sum(axis=1) | CONSTANTVALUE,
+        )
+        if self.model.p.mode != 1:
+            table.a[rules] = self.ruleRandom.uniform(0.7, 1.2, numRules)
+            table.b[rules] = self.ruleRandom.uniform(-10, 19.002, numRules)
+        else:
+            table.a[rules] = self.model.p.hreeA
+            table.b[rules] = self.model.p.hreeB
+        table.fitness[rules] = self.model.p.M
+        table.accuracy[rules] = self.model.p.initialPredictorVariance
+        table.errorVariance[rules] = self.model.p.initialPredictorVariance
+        table.prevForecast[rules] = 110
+        return table
+
+    def activateRules(self: ap.Agent) -> tuple[int, np.ndarray]:
+        """activating the rules matching the models worldState and returning an array reflecting the keys"""
+        activeSlots = np.flatnonzero(
+            self.rules.cachedMatching(self.model.worldMask)
+            if self.model.p.ruleCache
+            else self.rules.matching(self.model.worldMask)
+        )
         currentRuleKey = 0
-        for ruleID in self.rules:
-            for ruleBitID, ruleBit in enumerate(
-                self.rules[ruleID]["condition"].values(), 1
-            ):
-                if ruleBit is None:
-                    pass
-                elif ruleBit != self.model.worldState[ruleBitID]:
-                    # if the ruleBit is not None and does not match the worldState, the rule is not activated
-                    break
-                if ruleBitID == 11:
-                    self.rules[ruleID]["activationIndicator"] = 1
-                    self.rules[ruleID]["activationCount"] += 1
-                    activeRuleKeys.append(ruleID)
-                    if (currentRuleKey == 0) or (
-                        self.rules[currentRuleKey]["errorVariance"]
-                        > self.rules[ruleID]["errorVariance"]
-                    ):
-                        currentRuleKey = ruleID
+        if activeSlots.size:
+            self.rules.activationIndicator[activeSlots] = 1
+            self.rules.activationCount[activeSlots] += 1
+            # the first active rule with the lowest errorVariance becomes the current rule
+            currentRuleKey = self.rules.ruleIDs[
+                activeSlots[np.argmin(self.rules.errorVariance[activeSlots])]
+            ]
 
         if currentRuleKey == 0:
-            # if no rule is activated, the default rule is established as weighted average of all rules and activated
-            activeRuleKeys = [0]
-            weights = [rule["fitness"] for rule in self.rules.values()]
-            self.rules[0] = {
-                "condition": {
-                    i + 1: (None if i < 10 else True if i == 10 else False)
-                    for i in range(12)
-                },
-                "activationIndicator": 1,
-                "activationCount": 0,
-                "a": np.average(
-                    [rule["a"] for rule in self.rules.values()], weights=weights
-                ),
-                "b": np.average(
-                    [rule["b"] for rule in self.rules.values()], weights=weights
-                ),
-                "fitness": np.average(
-                    [rule["fitness"] for rule in self.rules.values()], weights=weights
-                ),
-                "accuracy": np.average(
-                    [rule["accuracy"] for rule in self.rules.values()], weights=weights
-                ),
-                "errorVariance": np.average(
-                    [rule["errorVariance"] for rule in self.rules.values()],
-                    weights=weights,
-                ),
-            }
-        return currentRuleKey, activeRuleKeys
+            if self.model.p.defaultPredictor == "table":
+                # if no rule is activated, the default rule is established as weighted average of all rules and activated
+                self.rules.setDefault()
+            return 0, np.zeros(1, dtype=np.int64)
+        return int(currentRuleKey), self.rules.ruleIDs[activeSlots]
 
     def utilityCalc(self: ap.Agent) -> float:
         """calculating the utility of the agent"""
@@ -222,22 +261,37 @@ class MarketStatistician(ap.Agent):
 
     def expectationFormation(self: ap.Agent, ruleID: int) -> float:
         """returning combined expected price plus dividend based on activated rule"""
-        return self.rules.get(ruleID).get("a") * (
-            self.model.price + self.model.dividend
-        ) + self.rules.get(ruleID).get("b")
+        slot = self.rules.slot(ruleID)
+        return (
+            self.rules.a[slot] * (self.model.price + self.model.dividend)
+            + self.rules.b[slot]
+        )
 
     def demandAndSlopeCalc(self: ap.Agent) -> float:
         """getting the demand and slope from the demand function"""
+        slot = self.rules.slot(self.currentRule)
         demand = (
             self.forecast - self.model.price * (1 + self.model.p.interestRate)
-        ) / (self.model.p.dorra * self.rules.get(self.currentRule).get("accuracy"))
-        slope = (
-            self.rules.get(self.currentRule).get("a") - (1 + self.model.p.interestRate)
-        ) / (self.model.p.dorra * self.rules.get(self.currentRule).get("accuracy"))
+        ) / (self.model.p.dorra * self.rules.accuracy[slot])
+        slope = (self.rules.a[slot] - (1 + self.model.p.interestRate)) / (
+            self.model.p.dorra * self.rules.accuracy[slot]
+        )
         # constrain demand based on multiple criteria
         demand = self.constrainDemand(demand)
         return demand, slope
 
+    def demandCoefficients(self: ap.Agent) -> tuple[float, float, float, float]:
+        """returning intercept and slope of the unconstrained demand in the price, position, and cash"""
+        slot = self.rules.slot(self.currentRule)
+        denominator = self.model.p.dorra * self.rules.accuracy[slot]
+        return (
+            (self.rules.a[slot] * self.model.dividend + self.rules.b[slot])
+            / denominator,
+            (self.rules.a[slot] - (1 + self.model.p.interestRate)) / denominator,
+            self.position,
+            self.cash,
+        )
+
     def constrainDemand(self: ap.Agent, demand: float) -> float:
         """constraining the demand to the maximum bid and the minimum holding"""
         consumption = demand - self.position
@@ -256,31 +310,27 @@ class MarketStatistician(ap.Agent):
 
     def errorVarianceUpdate(self: ap.Agent) -> None:
         """updating the errorVariance of the predictors"""
-        for ruleID in self.prevActiveRules:
-            if ruleID != 0:
-                self.rules[ruleID]["errorVariance"] = (
-                    1 - self.model.theta
-                ) * self.rules[ruleID]["errorVariance"] + self.model.theta * math.pow(
-                    self.model.price
-                    + self.model.dividend
-                    - self.rules[ruleID]["prevForecast"],
-                    2,
-                )
+        slots = self.rules.slot(self.prevActiveRules[self.prevActiveRules != 0])
+        self.rules.errorVariance[slots] = (
+            1 - self.model.theta
+        ) * self.rules.errorVariance[slots] + self.model.theta * np.square(
+            self.model.price + self.model.dividend - self.rules.prevForecast[slots]
+        )
 
     def prevForecastUpdate(self: ap.Agent) -> None:
         """updating the previous forecast of the predictors"""
-        for ruleID in self.activeRules:
-            if ruleID != 0:
-                # upating the previous forecast of the previously activated predictors
-                self.rules[ruleID]["prevForecast"] = self.expectationFormation(
-                    ruleID=ruleID
-                )
+        # upating the previous forecast of the previously activated predictors
+        slots = self.rules.slot(self.activeRules[self.activeRules != 0])
+        self.rules.prevForecast[slots] = (
+            self.rules.a[slots] * (self.model.price + self.model.dividend)
+            + self.rules.b[slots]
+        )
 
     def crossoverRule(
         self: ap.Agent, ruleID: int, parentRuleID1: int, parentRuleID2: int
     ) -> dict:
         """crossover of two parent rules"""
-        self.crossoverRandom = self.model.randomGenerator()
+        self.crossoverRandom = self.model.rng.generator("crossover", self.id)
         # uniform crossover on bitstring level
         constantConditions = {11: 1, 12: 0}
         variableConditions = {
@@ -333,7 +383,7 @@ class MarketStatistician(ap.Agent):
         self: ap.Agent, predictiveBit: bool, bit: bool | None | float
     ) -> bool | None | float:
         """mutating a single bit of a predictive vector or bitstring"""
-        self.mutationRandom = self.model.randomGenerator()
+        self.mutationRandom = self.model.rng.generator("mutation", self.id)
         if predictiveBit:
             # mutating a predictive vector
             # is this ok or do I need to make sure they stay in the specific ranges?
@@ -344,33 +394,32 @@ class MarketStatistician(ap.Agent):
             s.remove(bit)
             return self.mutationRandom.choice(list(s))
 
-    def geneticAlgorithmPreparation(self: ap.Agent, ruleID: str):
+    def geneticAlgorithmPreparation(self: ap.Agent):
         """preparing the rules for the genetic algorithm by updating accuracy and fitness"""
-        self.rules[ruleID]["accuracy"] = self.rules[ruleID]["errorVariance"]
-        s = sum(value != None for value in self.rules[ruleID]["condition"].values())
-        self.rules[ruleID]["fitness"] = (
-            1e9 - self.rules[ruleID]["errorVariance"] - (self.model.p.C * s)
+        rules = slice(0, self.model.p.M)  # all rules except the default rule
+        self.rules.accuracy[rules] = self.rules.errorVariance[rules]
+        s = BITCOUNT[self.rules.care[rules]]
+        self.rules.fitness[rules] = (
+            1e9 - self.rules.errorVariance[rules] - (self.model.p.C * s)
         )
 
     def geneticAlgorithm(self: ap.Agent):
         """performing the genetic algorithm"""
+        liveSlots = np.flatnonzero(self.rules.live)
         rulesToBeReplaced = set(
-            list(
-                dict(
-                    sorted(
-                        self.rules.items(), key=lambda item: item[1]["errorVariance"]
-                    )
-                ).keys()
-            )[-20:]
+            self.rules.ruleIDs[
+                liveSlots[
+                    np.argsort(self.rules.errorVariance[liveSlots], kind="stable")
+                ][-20:]
+            ].tolist()
         )
 
         parentRules = set(self.rules) - {0} - rulesToBeReplaced
         # fitness values and normalized fitness values (used as probabilities) of the parent rules
-        fitnessValues = [self.rules[i]["fitness"] for i in list(parentRules)]
-        normalizedFitnessValues = [float(i) / sum(fitnessValues) for i in fitnessValues]
+        fitnessValues = self.rules.fitness[self.rules.slot(np.array(list(parentRules)))]
+        normalizedFitnessValues = fitnessValues / sum(fitnessValues.tolist())
+        self.geneticAlgorithmPreparation()
         for ruleID in self.rules.keys():
-            if ruleID != 0:
-                self.geneticAlgorithmPreparation(ruleID=ruleID)
             if ruleID in rulesToBeReplaced and self.model.p.mode != 1:
                 # initializing new rule
                 self.rules[ruleID] = self.createRule()
@@ -405,3 +454,101 @@ class MarketStatistician(ap.Agent):
                             predictiveBit=False,
                             bit=self.rules[ruleID]["condition"][key],
                         )
+
+    def batchedGeneticAlgorithm(self: ap.Agent):
+        """performing the genetic algorithm for all replaced rules at once"""
+        rules, p = self.rules, self.model.p
+        liveSlots = np.flatnonzero(rules.live)
+        # the 20 rules with the highest errorVariance get replaced
+        replaced = np.sort(
+            liveSlots[np.argpartition(rules.errorVariance[liveSlots], -20)[-20:]]
+        )
+        parents = np.setdiff1d(
+            np.arange(p.M), replaced
+        )  # all other rules except the default rule
+        probabilities = rules.fitness[parents] / rules.fitness[parents].sum()
+        self.geneticAlgorithmPreparation()
+        if p.mode == 1:
+            # predictors of the clamped h.r.e.e. rules are never replaced
+            return
+        numReplaced = len(replaced)
+        newRules = self.createRules(numRules=numReplaced)
+        for key in FIELDS:
+            getattr(rules, key)[replaced] = getattr(newRules, key)[:numReplaced]
+        rules.live[replaced] = True
+        care, value = newRules.care[:numReplaced], newRules.value[:numReplaced]
+        a, b = newRules.a[:numReplaced], newRules.b[:numReplaced]
+        rows, bits = np.arange(numReplaced), 1 << np.arange(10)
+
+        # crossover takes place with probability 0.3 in the fast adaptation case
+        # and 0.1 in the slow adaptation case, parents are chosen based on fitness
+        crossover = self.gARandom.integers(100, size=numReplaced) < (
+            30 if p.forecastAdaptation else 10
+        )
+        pairs = self.gARandom.choice(parents, (numReplaced, 2), p=probabilities)
+        self.crossoverRandom = self.model.rng.generator("crossover", self.id)
+        # uniform crossover on bitstring level with the condition bits taken from the second parent
+        fromSecond = (
+            self.crossoverRandom.integers(2, size=(numReplaced, 10)) * bits
+        ).sum(axis=1)
+        # crossover on predictive vector level
+        # 0: crossover component-wise,
+        # 1: linear combination,
+        # 2: complete selection of one predictive vector
+        procedure = self.crossoverRandom.integers(3, size=numReplaced)
+        components = self.crossoverRandom.integers(2, size=(numReplaced, 2))
+        weights = self.crossoverRandom.uniform(0, 1, (numReplaced, 2))
+        parent = self.crossoverRandom.integers(2, size=numReplaced)
+        parentA, parentB = rules.a[pairs], rules.b[pairs]
+        care = np.where(
+            crossover,
+            (rules.care[pairs[:, 0]] & ~fromSecond)
+            | (rules.care[pairs[:, 1]] & fromSecond),
+            care,
+        )
+        value = np.where(
+            crossover,
+            (rules.value[pairs[:, 0]] & ~fromSecond)
+            | (rules.value[pairs[:, 1]] & fromSecond),
+            value,
+        )
+        a = np.where(
+            crossover,
+            np.select(
+                [procedure == 0, procedure == 1],
+                [parentA[rows, components[:, 0]], (parentA * weights).sum(axis=1)],
+                parentA[rows, parent],
+            ),
+            a,
+        )
+        b = np.where(
+            crossover,
+            np.select(
+                [procedure == 0, procedure == 1],
+                [
+                    parentB[rows, components[:, 1]],
+                    (parentB * (1 - weights)).sum(axis=1),
+                ],
+                parentB[rows, parent],
+            ),
+            b,
+        )
+
+        # mutation takes place with probability 0.03 per predictor and condition bit
+        self.mutationRandom = self.model.rng.generator("mutation", self.id)
+        mutation = self.mutationRandom.random((numReplaced, 12)) < 0.03
+        factors = self.mutationRandom.uniform(0.95, 1.05, (numReplaced, 2))
+        shifts = self.mutationRandom.integers(1, 3, (numReplaced, 10))
+        rules.a[replaced] = np.where(mutation[:, 0], a * factors[:, 0], a)
+        rules.b[replaced] = np.where(mutation[:, 1], b * factors[:, 1], b)
+        # a mutated condition bit changes to one of its two other states None, 0, or 1 (encoded as 0, 1, 2)
+        states = ((care[:, None] >> np.arange(10)) & 1) * (
+            1 + ((value[:, None] >> np.arange(10)) & 1)
+        )
+        states = np.where(mutation[:, 2:], (states + shifts) % 3, states)
+        variableBits = bits.sum()
+        rules.setCondition(
+            replaced,
+            (care & ~variableBits) | ((states > 0) * bits).sum(axis=1),
+            (value & ~variableBits) | ((states == 2) * bits).sum(axis=1),
+        )
@@ -0,0 +1,159 @@
+from store import Store
+from running_stats import RunningMoments, RunningCovariance, RunningAutocorrelation
+
+from concurrent.futures import ProcessPoolExecutor
+import agentpy as ap
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+
+SERIES = [
+    "returns",
+    "squaredReturns",
+    "absoluteReturns",
+    "volume",
+]  # series whose autocorrelation functions are computed
+
+
+def runKey(store: Store, run: str, maxLag: int) -> dict:
+    """returning the key of the cached facts of a run, changing whenever the run is rewritten"""
+    return {
+        "maxLag": maxLag,
+        "chunks": {key: store.chunks(key, run) for key in store.variables(run)},
+    }
+
+
+def runFacts(path: str, run: str, maxLag: int = 100) -> dict:
+    """computing the stylized facts of a run chunk by chunk of the stored price series
+
+    The returns are log returns of the price, continued across chunk borders with the
+    last price of the previous chunk. The volume is matched to the returns of the same
+    step, and the price is compared with the hree price of the same step.
+    """
+    store = Store(path)
+    variables = store.variables(run)
+    moments = RunningMoments()
+    autocorrelations = {key: RunningAutocorrelation(maxLag) for key in SERIES}
+    volumeAbsolute, volumeSquared = RunningCovariance(), RunningCovariance()
+    deviation, hree = RunningMoments(), RunningCovariance()
+    previous = None  # last price of the previous chunk
+    for start, stop in store.chunks("price", run):
+        price = store.series("price", run, start, stop)
+        logPrice = np.log(price)
+        returns = logPrice.diff()
+        if previous is not None:
+            returns.iloc[0] = logPrice.iloc[0] - previous
+        previous = logPrice.iloc[-1]
+        returns = returns.dropna()
+        moments.push(returns)
+        autocorrelations["returns"].push(returns)
+        autocorrelations["squaredReturns"].push(returns**2)
+        autocorrelations["absoluteReturns"].push(returns.abs())
+        if "aggregatedVolume" in variables:
+            volume = store.series("aggregatedVolume", run, start, stop)
+            autocorrelations["volume"].push(volume)
+            pairs = pd.concat([volume, returns], axis=1, join="inner").dropna()
+            volumeAbsolute.push(pairs.iloc[:, 0], pairs.iloc[:, 1].abs())
+            volumeSquared.push(pairs.iloc[:, 0], pairs.iloc[:, 1] ** 2)
+        if "hreePrice" in variables:
+            pairs = pd.concat(
+                [price, store.series("hreePrice", run, start, stop)],
+                axis=1,
+                join="inner",
+            ).dropna()
+            deviation.push(pairs.iloc[:, 0] - pairs.iloc[:, 1])
+            hree.push(pairs.iloc[:, 0], pairs.iloc[:, 1])
+    summary = {
+        "steps": moments.count,
+        "meanReturn": moments.mean,
+        "stdReturn": float(np.sqrt(moments.variance)),
+        "skewness": moments.skewness,
+        "kurtosis": moments.kurtosis,
+        "volumeAbsoluteCorrelation": volumeAbsolute.correlation,
+        "volumeSquaredCorrelation": volumeSquared.correlation,
+        "meanHreeDeviation": deviation.mean if deviation.count else np.nan,
+        "stdHreeDeviation": float(np.sqrt(deviation.variance)),
+        "rmsHreeDeviation": float(np.sqrt(deviation.variance + deviation.mean**2)),
+        "hreeCorrelation": hree.correlation,
+    }
+    return {
+        "summary": {key: float(value) for key, value in summary.items()},
+        "acf": {key: acf.acf().tolist() for key, acf in autocorrelations.items()},
+    }
+
+
+def cachedFacts(cachePath: str, run: str, key: dict) -> dict | None:
+    """returning the cached facts of a run if they were computed for the same key"""
+    try:
+        with open(os.path.join(cachePath, f"{run}.json")) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return cached["facts"] if cached["key"] == key else None
+
+
+def cacheFacts(cachePath: str, run: str, key: dict, facts: dict) -> None:
+    """writing the facts of a run to the cache"""
+    os.makedirs(cachePath, exist_ok=True)
+    runPath = os.path.join(cachePath, f"{run}.json")
+    with open(runPath + ".tmp", "w") as file:
+        json.dump({"key": key, "facts": facts}, file)
+    os.replace(runPath + ".tmp", runPath)
+
+
+def stylizedFacts(
+    path: str,
+    maxLag: int = 100,
+    workers: int | None = None,
+    cachePath: str | None = None,
+) -> ap.DataDict:
+    """computing the stylized facts of all runs of a store in parallel
+
+    The facts of each run are cached in <path>/analysis, or in cachePath, so a
+    repeated report only computes the runs which were added or rewritten since.
+    """
+    store = Store(path)
+    cachePath = cachePath or os.path.join(path, "analysis")
+    keys = {run: runKey(store, run, maxLag) for run in store.runs}
+    facts = {run: cachedFacts(cachePath, run, key) for run, key in keys.items()}
+    missing = [run for run in store.runs if facts[run] is None]
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for run, computed in zip(
+                missing,
+                pool.map(
+                    runFacts, [path] * len(missing), missing, [maxLag] * len(missing)
+                ),
+            ):
+                cacheFacts(cachePath, run, keys[run], computed)
+                facts[run] = computed
+    runs = pd.Index(store.runs, name="run")
+    results = ap.DataDict()
+    results["summary"] = pd.DataFrame(
+        [facts[run]["summary"] for run in runs], index=runs
+    )
+    results["acf"] = pd.concat(
+        {
+            run: pd.DataFrame(
+                facts[run]["acf"], index=pd.RangeIndex(maxLag + 1, name="lag")
+            )
+            for run in runs
+        },
+        names=["run"],
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="computing the stylized facts of the runs of a store"
+    )
+    parser.add_argument("storePath")
+    parser.add_argument("--maxLag", type=int, default=100)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    facts = stylizedFacts(args.storePath, args.maxLag, args.workers)
+    print(facts["summary"].T.to_string())
+    print(facts["acf"].xs(1, level="lag").to_string())  # first order autocorrelations
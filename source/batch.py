@@ -0,0 +1,229 @@
+from model import ArtificialStockMarket as ASM
+from population import Population, STATE, sequentialSum
+from rules import MatchCache
+from clearing import clearingPrice
+
+import agentpy as ap
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+PUBLISHED = STATE + [
+    "currentSlot",
+    "active",
+    "prevActive",
+    "currentA",
+    "currentB",
+    "currentAccuracy",
+]  # population arrays handed back to the replicas after each step
+
+
+class BatchPopulation(Population):
+    """population arrays of all replicas of a batch stacked along a leading replica axis
+
+    The rule fields are stored as (R, N, M + 1) arrays and the agent variables as
+    (R, N) arrays. The populations of the replicas keep their rule arrays as views
+    on the batch, so their agents, caches, and genetic algorithms work unchanged.
+    """
+
+    def __init__(self, model, populations: list):
+        self.model = model
+        self.populations = populations
+        self.rules = {
+            key: np.stack([population.rules[key] for population in populations])
+            for key in populations[0].rules
+        }
+        for replica, population in enumerate(populations):
+            population.bind({key: array[replica] for key, array in self.rules.items()})
+        for key in STATE + ["currentSlot", "active", "prevActive"]:
+            setattr(
+                self,
+                key,
+                np.stack([getattr(population, key) for population in populations]),
+            )
+        self.members = [
+            agent for population in populations for agent in population.members
+        ]
+        self.compiled = False  # the kernels work on the arrays of a single population
+        self.cache = MatchCache(
+            self.rules["care"], self.rules["value"], self.rules["live"]
+        )  # matching all replicas at once without cache
+
+    def matching(self) -> np.ndarray:
+        """returning the live rules of all agents of all replicas matching their current world states"""
+        if self.model.p.ruleCache:
+            # looking up each replica in its own cache, as in a standalone run
+            return np.stack(
+                [
+                    population.cache.lookup(int(worldMask))
+                    for population, worldMask in zip(
+                        self.populations, self.model.worldMask.flat
+                    )
+                ]
+            )
+        return self.cache.match(self.model.worldMask)
+
+    def triggers(self) -> np.ndarray:
+        """returning whether the genetic algorithm of each agent of all replicas fires"""
+        return np.concatenate(
+            [population.triggers() for population in self.populations]
+        )
+
+    def publish(self):
+        """handing views on the current arrays of each replica to its population"""
+        for replica, population in enumerate(self.populations):
+            for key in PUBLISHED:
+                setattr(population, key, getattr(self, key)[replica])
+
+
+class BatchedMarkets:
+    """independent markets differing only in their seeds simulated as one array program
+
+    Each replica is a regular ArtificialStockMarket with the population engine and
+    its own random streams. Dividends, world states, genetic algorithms, and
+    documentation stay with the replicas, while rule activation, the specialist's
+    price search, and the updates of all agents run once for the whole batch. The
+    output of each replica equals a standalone run with the same seed.
+    """
+
+    def __init__(self, parameters: dict, seeds: list, model: ap.Model = ASM):
+        self.parameters = dict(parameters, engine="population")
+        self.seeds = list(seeds)
+        self.markets = [
+            model(dict(self.parameters, seed=seed), _run_id=(replica, None))
+            for replica, seed in enumerate(self.seeds)
+        ]
+
+    def setup(self):
+        """setting up all replicas and stacking their populations"""
+        for market in self.markets:
+            market.sim_setup()
+        self.p = self.markets[0].p
+        self.theta = self.markets[0].theta
+        self.t = self.markets[0].t
+        self.steps = self.markets[0]._steps
+        self.price = np.array([[float(market.price)] for market in self.markets])
+        self.dividend = np.array([[float(market.dividend)] for market in self.markets])
+        self.worldMask = np.zeros((len(self.markets), 1, 1), dtype=np.int64)
+        self.population = BatchPopulation(
+            self, [market.population for market in self.markets]
+        )
+
+    def step(self):
+        """following the model centered timeline of all replicas"""
+        self.t += 1
+        for replica, market in enumerate(self.markets):
+            market.t += 1
+            market.dividend = market.dividend_process()
+            market.worldState = market.worldInformation()
+            market.worldMask = market.encodeWorldState()
+            self.price[replica] = market.price
+            self.dividend[replica] = market.dividend
+            self.worldMask[replica] = market.worldMask
+        self.population.step()  # activating world state matching predictors of all replicas at once
+        self.specialistPriceCalc()
+        self.population.update()  # updating agent specific variables of all replicas at once
+        self.population.publish()
+        for replica, market in enumerate(self.markets):
+            market.price = self.price[replica, 0]
+            market.aggregatedVolume = self.aggregatedVolume[replica]
+            market.specialistTrials = int(self.specialistTrials[replica])
+            market.demandDifference = self.demandDifference[replica]
+            market.population.document()
+            market.document()
+            market.update()
+
+    def specialistPriceCalc(self):
+        """iterative specialist price determination of all replicas, each stopping on its own"""
+        if self.p.clearing == "exact":
+            return self.clearingPriceCalc()
+        p, population = self.p, self.population
+        price = self.price[:, 0]  # view on the prices of all replicas
+        self.specialistTrials = np.zeros(len(self.markets), dtype=np.int64)
+        self.demandDifference = np.zeros(len(self.markets))
+        settled = {
+            key: np.zeros_like(population.cash)
+            for key in ["forecast", "demand", "slope"]
+        }
+        searching = np.ones(len(self.markets), dtype=bool)
+        while searching.any():
+            self.specialistTrials[searching] += 1
+            population.specialistSteps()  # specialist steps of all agents at once
+            for key, values in settled.items():
+                # keeping the values of the last trial of each replica
+                values[searching] = getattr(population, key)[searching]
+            sumDemand = sequentialSum(population.demand)
+            sumSlope = sequentialSum(population.slope)
+            self.demandDifference[searching] = sumDemand[searching] - p.N
+            searching &= ~(np.abs(self.demandDifference) < p.epsilon)
+            slope = searching & (sumSlope != 0)
+            price[slope] -= self.demandDifference[slope] / sumSlope[slope]
+            factor = searching & (sumSlope == 0)
+            price[factor] *= 1 + 0.0005 * self.demandDifference[factor]
+            price[searching] = np.where(
+                price[searching] < p.minPrice,
+                p.minPrice,
+                np.where(price[searching] > p.maxPrice, p.maxPrice, price[searching]),
+            )
+            searching &= self.specialistTrials < p.trialsSpecialist
+        for key, values in settled.items():
+            setattr(population, key, values)
+
+    def clearingPriceCalc(self):
+        """exact market clearing of each replica and evaluating the demand of all agents at once"""
+        alpha, beta, position, cash = self.population.demandCoefficients()
+        for replica in range(len(self.markets)):
+            self.price[replica] = clearingPrice(
+                alpha[replica],
+                beta[replica],
+                position[replica],
+                cash[replica],
+                self.p,
+                self.price[replica, 0],
+            )
+        self.population.specialistSteps()
+        self.specialistTrials = np.ones(len(self.markets), dtype=np.int64)
+        self.demandDifference = sequentialSum(self.population.demand) - self.p.N
+
+    def run(self, display: bool = True) -> ap.DataDict:
+        """running all replicas and returning their combined output like an agentpy experiment"""
+        start = datetime.now()
+        self.setup()
+        while self.t < self.steps:
+            self.step()
+            if display:
+                print(f"\rCompleted: {self.t} steps", end="")
+        for market in self.markets:
+            market.running = False
+            market.end()
+            market.create_output()
+        if display:
+            print(f"\nRun time: {datetime.now() - start}\nSimulation finished")
+        return self.output()
+
+    def output(self) -> ap.DataDict:
+        """combining the outputs of all replicas indexed by their sample_id"""
+        outputs = [market.output for market in self.markets]
+        results = ap.DataDict()
+        results["info"] = {
+            "model_type": self.markets[0].type,
+            "completed_steps": self.t,
+            "replicas": len(self.markets),
+        }
+        results["parameters"] = ap.DataDict(
+            constants={
+                key: value for key, value in self.parameters.items() if key != "seed"
+            },
+            sample=pd.DataFrame(
+                {"seed": self.seeds},
+                index=pd.Index(range(len(self.seeds)), name="sample_id"),
+            ),
+        )
+        results["variables"] = ap.DataDict(
+            {
+                objType: pd.concat([output["variables"][objType] for output in outputs])
+                for objType in outputs[0]["variables"]
+            }
+        )
+        results["reporters"] = pd.concat([output["reporters"] for output in outputs])
+        return results
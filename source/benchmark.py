@@ -0,0 +1,169 @@
+from model_params import parameters
+from model import ArtificialStockMarket as ASM
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import argparse
+import hashlib
+import itertools
+import json
+import platform
+import resource
+import sys
+import time
+
+SUITES = {
+    "quick": {
+        "N": [25],
+        "M": [100],
+        "steps": [1000],
+        "forecastAdaptation": [0, 1],
+    },
+    "scaling": {
+        "N": [25, 250, 1000, 5000],
+        "M": [100, 250, 1000],
+        "steps": [1000],
+        "forecastAdaptation": [0, 1],
+    },
+    "long": {
+        "N": [25],
+        "M": [100],
+        "steps": [10000, 50000],
+        "forecastAdaptation": [0, 1],
+    },
+}  # grids of the benchmark cases per suite
+
+BASE = {
+    "seed": 42,
+    "mode": 0,
+    "engine": "population",
+    "profile": True,
+    "streamPath": None,
+    "checkpointPath": None,
+    "profilePath": None,
+    # the final rules as strings would dominate the time and memory of large cases
+    "recording": (("rules", "off"),),
+}  # fixed parameters of all benchmark cases
+
+
+def benchmarkCases(suite: str, engine: str = "population") -> dict:
+    """returning the parameters of all cases of a suite by case name"""
+    grid = SUITES[suite]
+    cases = {}
+    for values in itertools.product(*grid.values()):
+        case = dict(zip(grid, values))
+        name = "_".join(f"{key}{value}" for key, value in case.items())
+        cases[name] = dict(parameters) | BASE | {"engine": engine} | case
+    return cases
+
+
+def fingerprint(values: np.ndarray) -> str:
+    """returning the hash of a series, equal only for bitwise identical values"""
+    return hashlib.sha256(
+        np.ascontiguousarray(values, dtype=np.float64).tobytes()
+    ).hexdigest()
+
+
+def runCase(params: dict) -> dict:
+    """running one case and returning its speed, peak memory, phase times, and result fingerprints
+
+    Only the step loop is timed, leaving out the setup, the end, and the output.
+    """
+    model = ASM(params)
+    model.sim_setup()
+    start = time.perf_counter()
+    while model.running:
+        model.sim_step()
+    seconds = time.perf_counter() - start
+    model.end()
+    model.create_output()
+    results = model.output
+    variables = results["variables"]["ArtificialStockMarket"]
+    return {
+        "seconds": seconds,
+        "stepsPerSecond": float(params["steps"]) / seconds,
+        "peakRSS": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / 1024,  # MB on Linux
+        "phases": results["profile"]["ownTime"].to_dict(),
+        "price": fingerprint(variables["price"].values),
+        "dividend": fingerprint(variables["dividend"].values),
+        "finalPrice": float(variables["price"].iloc[-1]),
+    }
+
+
+def runBenchmark(suite: str, engine: str = "population") -> dict:
+    """running all cases of a suite, each in a fresh process for its own peak memory"""
+    cases = {}
+    for name, params in benchmarkCases(suite, engine).items():
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            cases[name] = pool.submit(runCase, params).result()
+        print(
+            f"{name}: {cases[name]['stepsPerSecond']:.1f} steps/s, "
+            f"{cases[name]['peakRSS']:.0f} MB"
+        )
+    return {
+        "suite": suite,
+        "engine": engine,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cases": cases,
+    }
+
+
+def compareBenchmarks(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    """returning the regressions of the current run against the baseline
+
+    A case regresses if its steps per second drop by more than the threshold or if
+    its price or dividend series is no longer bitwise identical.
+    """
+    regressions = []
+    for name, case in current["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        reference = baseline["cases"][name]
+        change = case["stepsPerSecond"] / reference["stepsPerSecond"] - 1
+        print(f"{name}: {change:+.1%} steps/s")
+        if change < -threshold:
+            regressions.append(f"{name}: {change:+.1%} steps/s")
+        for key in ["price", "dividend"]:
+            if case[key] != reference[key]:
+                regressions.append(f"{name}: {key} series changed")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="benchmarking the artificial stock market"
+    )
+    parser.add_argument("command", choices=["run", "compare"])
+    parser.add_argument("--suite", choices=list(SUITES), default="quick")
+    parser.add_argument(
+        "--engine", choices=["agents", "population"], default="population"
+    )
+    parser.add_argument("--output", help="file to save the results of the run to")
+    parser.add_argument("--baseline", help="file of the baseline to compare against")
+    parser.add_argument(
+        "--current", help="file of the results to compare, run anew if missing"
+    )
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+    if args.command == "run":
+        results = runBenchmark(args.suite, args.engine)
+        with open(args.output or f"benchmark_{args.suite}.json", "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if args.current:
+            with open(args.current) as file:
+                current = json.load(file)
+        else:
+            current = runBenchmark(baseline["suite"], baseline["engine"])
+            if args.output:
+                with open(args.output, "w") as file:
+                    json.dump(current, file, indent=2)
+        regressions = compareBenchmarks(baseline, current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
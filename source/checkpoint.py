@@ -0,0 +1,143 @@
+from rules import RuleTable, FIELDS
+from population import STATE
+
+import agentpy as ap
+import numpy as np
+import json
+import os
+
+RULEFIELDS = list(FIELDS) + ["care", "value", "live"]  # arrays of a rule table
+
+
+def saveCheckpoint(model: ap.Model, path: str) -> None:
+    """saving the state of a model needed to resume its simulation as npz file
+
+    The checkpoint holds the rule arrays and variables of all agents stacked in agent
+    order, price and dividend, the incremental statistics, and the states of all
+    random generators as JSON.
+    """
+    agents = list(model.agents)
+    arrays = {
+        "model/price": model.price,
+        "model/dividend": model.dividend,
+        "model/pdVariance": [
+            model.pdVariance.count,
+            model.pdVariance.mean,
+            model.pdVariance.m2,
+        ],
+        "agents/obj_id": [agent.id for agent in agents],
+        "agents/currentRule": [agent.currentRule for agent in agents],
+        "agents/activeRules": [
+            np.isin(agent.rules.ruleIDs, agent.activeRules) for agent in agents
+        ],  # active slots of each agent
+        "rng": json.dumps(randomState(model), default=lambda array: array.tolist()),
+    }
+    for periods, movingAverage in model.priceMA.items():
+        arrays[f"model/priceMA/{periods}"] = movingAverage.buffer[
+            : movingAverage.window
+        ]
+        arrays[f"model/priceMA/{periods}/state"] = [
+            movingAverage.count,
+            movingAverage.position,
+        ]
+    for key in STATE:
+        arrays[f"agents/{key}"] = [getattr(agent, key) for agent in agents]
+    for key in RULEFIELDS:
+        arrays[f"rules/{key}"] = np.stack(
+            [getattr(agent.rules, key) for agent in agents]
+        )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(path + ".tmp", path)  # never leaving a partial checkpoint
+
+
+def loadCheckpoint(path: str) -> dict:
+    """loading all arrays of a checkpoint"""
+    with np.load(path) as checkpoint:
+        return dict(checkpoint)
+
+
+def randomState(model: ap.Model) -> dict:
+    """returning the states of the random module, generators, and pre-drawn blocks of a model"""
+    model.rng.sync()  # the blocks of the agents drawn in lockstep by the population
+    return {
+        "seed": model.rng.seed,
+        "random": model.random.getstate(),
+        "hree": model.hreeRandom.bit_generator.state,
+        "dividend": model.dividendRandom.bit_generator.state,
+        "streams": [
+            [purpose, key, generator.bit_generator.state]
+            for (purpose, key), generator in model.rng.generators.items()
+        ],
+        "blocks": [
+            [purpose, key, block.high, getattr(block, "values", None), block.position]
+            for (purpose, key), block in model.rng.blocks.items()
+        ],
+    }
+
+
+def readRules(checkpoint: dict, objId: int, numRules: int) -> RuleTable:
+    """returning the rule table of an agent from a checkpoint"""
+    row = list(checkpoint["agents/obj_id"]).index(objId)
+    return RuleTable(
+        numRules=numRules,
+        fields={key: checkpoint[f"rules/{key}"][row].copy() for key in RULEFIELDS},
+    )
+
+
+def restoreCheckpoint(model: ap.Model, checkpoint: dict) -> None:
+    """restoring the state of a set up model from a checkpoint
+
+    Agents are matched by their id and overwritten after their setup, which
+    activated their rules once more for the first world state.
+    """
+    model.price = checkpoint["model/price"].item()
+    model.dividend = checkpoint["model/dividend"].item()
+    model.document()  # replacing the variables recorded during setup
+    count, mean, m2 = checkpoint["model/pdVariance"].tolist()
+    model.pdVariance.count, model.pdVariance.mean, model.pdVariance.m2 = (
+        int(count),
+        mean,
+        m2,
+    )
+    for periods, movingAverage in model.priceMA.items():
+        count, position = checkpoint[f"model/priceMA/{periods}/state"].tolist()
+        movingAverage.buffer = np.tile(checkpoint[f"model/priceMA/{periods}"], 2)
+        movingAverage.count, movingAverage.position = count, position
+        movingAverage.resum()
+    model.update()
+    model.record(["varPriceDividend"])
+
+    rows = {
+        objId: row for row, objId in enumerate(checkpoint["agents/obj_id"].tolist())
+    }
+    for agent in model.agents:
+        row = rows[agent.id]
+        for key in RULEFIELDS:
+            getattr(agent.rules, key)[:] = checkpoint[f"rules/{key}"][row]
+        agent.rules.clearCache()
+        agent.rules.recount()
+        for key in STATE:
+            setattr(agent, key, checkpoint[f"agents/{key}"][row].item())
+        agent.currentRule = checkpoint["agents/currentRule"][row].item()
+        agent.activeRules = agent.rules.ruleIDs[checkpoint["agents/activeRules"][row]]
+
+    restoreRandomState(model, json.loads(checkpoint["rng"].item()))
+
+
+def restoreRandomState(model: ap.Model, state: dict) -> None:
+    """restoring the states of the random module, generators, and pre-drawn blocks of a model"""
+    version, internal, gauss = state["random"]
+    model.random.setstate((version, tuple(internal), gauss))
+    model.rng.seed = state["seed"]
+    model.rng.lockstep = {}  # taking up the restored blocks on the next draw
+    for purpose, key, generatorState in state["streams"]:
+        model.rng.generator(purpose, key).bit_generator.state = generatorState
+    for purpose, key, high, values, position in state["blocks"]:
+        block = model.rng.block(purpose, key, high=high)
+        if values is not None:
+            block.values = values
+        block.position = position
+    model.hreeRandom.bit_generator.state = state["hree"]
+    model.dividendRandom.bit_generator.state = state["dividend"]
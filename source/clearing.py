@@ -0,0 +1,144 @@
+import numpy as np
+
+
+def demandCoefficients(
+    prices: np.ndarray,
+    alpha: np.ndarray,
+    beta: np.ndarray,
+    position: np.ndarray,
+    cash: np.ndarray,
+    p: dict,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """returning coefficients (A, B, K) with constrained demand = A + B * price + K / price at the given prices
+
+    The branches follow MarketStatistician.constrainDemand, with the unconstrained
+    demand alpha + beta * price of each agent.
+    """
+    A = np.broadcast_to(alpha, prices.shape).copy()
+    B = np.broadcast_to(beta, prices.shape).copy()
+    K = np.zeros(prices.shape)
+    # constraining the demand to the maximum bid
+    consumption = A + B * prices - position
+    upper, lower = consumption > p.maxBid, consumption < -p.maxBid
+    A = np.where(upper, p.maxBid + position, np.where(lower, -p.maxBid + position, A))
+    B = np.where(upper | lower, 0, B)
+    # constraining the demand to the available cash
+    demand = A + B * prices
+    exceedingCash = (demand > 0) & ((demand * prices) > cash)
+    A, B = np.where(exceedingCash, 0, A), np.where(exceedingCash, 0, B)
+    K = np.where(exceedingCash & (cash > 0), np.broadcast_to(cash, prices.shape), K)
+    # constraining the demand to the minimum holding
+    demand = A + B * prices + K / prices
+    holding = ~exceedingCash & (demand < 0) & (demand + position < p.minHolding)
+    A, B = np.where(holding, p.minHolding, A), np.where(holding, 0, B)
+    return A, B, K
+
+
+def kinkPrices(
+    alpha: np.ndarray, beta: np.ndarray, position: np.ndarray, cash: np.ndarray, p: dict
+) -> np.ndarray:
+    """returning the (N, 8) prices at which the constrained demand of an agent changes its branch"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cashRoot = np.sqrt(np.square(alpha) + 4 * beta * cash)
+        kinks = np.stack(
+            [
+                (position + p.maxBid - alpha) / beta,  # maximum bid reached
+                (position - p.maxBid - alpha) / beta,  # maximum offer reached
+                -alpha / beta,  # demand changes its sign
+                (p.minHolding - position - alpha) / beta,  # minimum holding reached
+                (-alpha + cashRoot) / (2 * beta),  # unconstrained demand exhausts cash
+                (-alpha - cashRoot) / (2 * beta),
+                cash / (position + p.maxBid),  # maximum bid exhausts cash
+                cash / (position - p.maxBid),
+            ],
+            axis=1,
+        )
+    # kinks outside of the admissible price range are moved to its upper bound
+    valid = np.isfinite(kinks) & (kinks > p.minPrice) & (kinks < p.maxPrice)
+    return np.where(valid, kinks, p.maxPrice)
+
+
+def clearingPrice(
+    alpha: np.ndarray,
+    beta: np.ndarray,
+    position: np.ndarray,
+    cash: np.ndarray,
+    p: dict,
+    price: float,
+) -> float:
+    """returning the price closest to the given price at which the constrained demand equals the N shares
+
+    Between the sorted kink prices of all agents every agent's demand is of the form
+    A + B * price + K / price, so the market clears where B * price^2 + (A - N) * price
+    + K = 0 within one of these intervals. If the market cannot clear within
+    [minPrice, maxPrice], the price with the smallest excess demand is returned,
+    which is exactly minPrice or maxPrice if the excess demand is smallest there.
+    """
+    N = len(alpha)
+    # branches of each agent between its own sorted kinks
+    bounds = np.sort(kinkPrices(alpha, beta, position, cash, p), axis=1)
+    alpha, beta = alpha[:, None], beta[:, None]
+    position, cash = position[:, None], cash[:, None]
+    bounds = np.hstack(
+        [np.full((N, 1), p.minPrice), bounds, np.full((N, 1), p.maxPrice)]
+    )
+    midpoints = (bounds[:, 1:] + bounds[:, :-1]) / 2
+    coefficients = np.stack(
+        demandCoefficients(midpoints, alpha, beta, position, cash, p)
+    )
+
+    # sweeping over all kinks in ascending order while summing the branch changes
+    kinks = bounds[:, 1:-1].ravel()
+    changes = (coefficients[:, :, 1:] - coefficients[:, :, :-1]).reshape(3, -1)
+    order = np.argsort(kinks, kind="stable")
+    intervals = np.concatenate([[p.minPrice], kinks[order], [p.maxPrice]])
+    A, B, K = np.hstack(
+        [
+            coefficients[:, :, 0].sum(axis=1, keepdims=True),
+            coefficients[:, :, 0].sum(axis=1, keepdims=True)
+            + np.cumsum(changes[:, order], axis=1),
+        ]
+    )
+
+    # solving B * price^2 + (A - N) * price + K = 0 on every interval
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(np.square(A - N) - 4 * B * K)
+        roots = np.concatenate(
+            [
+                np.where(B != 0, (-(A - N) + root) / (2 * B), -K / (A - N)),
+                np.where(B != 0, (-(A - N) - root) / (2 * B), np.nan),
+            ]
+        )
+    # accepting roots up to a relative tolerance around the interval to allow for rounding of the sums
+    lower, upper = np.tile(intervals[:-1], 2), np.tile(intervals[1:], 2)
+    valid = (
+        np.isfinite(roots)
+        & (roots >= lower * (1 - 1e-9))
+        & (roots <= upper * (1 + 1e-9))
+    )
+    if valid.any():
+        roots = np.clip(roots[valid], p.minPrice, p.maxPrice)
+        return float(roots[np.argmin(np.abs(roots - price))])
+
+    # no clearing price, returning the price with the smallest excess demand among the prices
+    # just inside the interval bounds and the stationary points within the intervals
+    lower, upper = intervals[:-1], intervals[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stationary = np.sqrt(K / B)
+    stationary = np.where(
+        np.isfinite(stationary) & (stationary > lower) & (stationary < upper),
+        stationary,
+        (lower + upper) / 2,
+    )
+    # the bounds of the price range are admissible themselves, like the specialist's clamping
+    candidates = np.concatenate(
+        [
+            np.where(lower == p.minPrice, p.minPrice, lower + (upper - lower) * 1e-9),
+            stationary,
+            np.where(upper == p.maxPrice, p.maxPrice, upper - (upper - lower) * 1e-9),
+        ]
+    )
+    A, B, K = np.tile(A, 3), np.tile(B, 3), np.tile(K, 3)
+    excess = np.abs(A + B * candidates + K / candidates - N)
+    excess[np.tile(upper <= lower, 3)] = np.inf
+    return float(candidates[np.argmin(excess)])
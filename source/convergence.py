@@ -0,0 +1,82 @@
+import numpy as np
+import math
+
+STATISTICS = {
+    "avgBitsUsed": (lambda model: np.average(model.agentVariable("bitsUsed")), np.mean),
+    "hreeGap": (lambda model: abs(model.price - model.hreePrice), np.mean),
+    "returnVariance": (
+        lambda model: math.log(model.price),
+        lambda logPrices: np.var(np.diff(logPrices)),
+    ),
+}  # value observed each step and its reduction over a window per statistic
+
+
+def statistic(key: str) -> tuple:
+    """returning the observed value and window reduction of a statistic, the window mean of a model variable by default"""
+    return STATISTICS.get(key, (lambda model: getattr(model, key), np.mean))
+
+
+def relativeChange(previous: float, current: float) -> float:
+    """returning the change of a statistic relative to its previous value"""
+    if previous == current:
+        return 0.0
+    return abs(current - previous) / abs(previous) if previous != 0 else math.inf
+
+
+class ConvergenceMonitor:
+    """windowed statistics of a run and whether they have settled
+
+    Criteria are given as (statistic, tolerance) entries, e.g. (("avgBitsUsed", 0.02),
+    ("hreeGap", 0.05), ("returnVariance", 0.1)), with the statistics of STATISTICS or
+    the name of any model variable. Each statistic is reduced over non-overlapping
+    windows of `window` steps, and the run is stable once the statistics of the
+    latest window differ from those of the preceding window by at most their
+    relative tolerances.
+    """
+
+    def __init__(self, criteria: tuple, window: int):
+        self.tolerances = dict(criteria)
+        self.window = window
+        self.values = {
+            key: [] for key in self.tolerances
+        }  # observed values of the current window
+        self.statistics = {}  # statistics of the latest full window
+        self.changes = {}  # relative changes of the statistics to the preceding window
+        self.convergedStep = None  # first step at which the statistics were stable
+
+    def observe(self, model) -> None:
+        """observing the values of the current step and closing the window once it is full"""
+        for key, values in self.values.items():
+            values.append(statistic(key)[0](model))
+        if len(values) == self.window:
+            self.closeWindow(model.t)
+
+    def closeWindow(self, t: int) -> None:
+        """reducing the values of the full window and comparing them with the preceding window"""
+        statistics = {
+            key: float(statistic(key)[1](np.array(values)))
+            for key, values in self.values.items()
+        }
+        if self.statistics:
+            self.changes = {
+                key: relativeChange(self.statistics[key], value)
+                for key, value in statistics.items()
+            }
+        self.statistics = statistics
+        for values in self.values.values():
+            values.clear()
+        if self.stable and self.convergedStep is None:
+            self.convergedStep = t
+
+    @property
+    def stable(self) -> bool:
+        return bool(self.changes) and all(
+            self.changes[key] <= tolerance for key, tolerance in self.tolerances.items()
+        )
+
+    def reason(self) -> str:
+        """returning the relative changes of the latest window against their tolerances"""
+        return ", ".join(
+            f"{key} {self.changes[key]:.3g} <= {tolerance:g}"
+            for key, tolerance in self.tolerances.items()
+        )
@@ -0,0 +1,211 @@
+from model import ArtificialStockMarket as ASM
+
+import agentpy as ap
+import numpy as np
+import pandas as pd
+
+ENSEMBLE = {
+    "price": "price",
+    "aggregatedVolume": "aggregatedVolume",
+    "avgBitsUsed": "avgBitsUsed",
+    "hreeDeviation": "price - hreePrice",
+}  # expressions of the model variables summarized over the runs of an ensemble
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)  # quantiles of the ensemble summary
+
+
+class StepMoments:
+    """count, mean, and sum of squared deviations of a variable per time step over runs
+
+    Runs are added with Welford's update and partial moments of other workers are
+    merged with the pairwise update of Chan et al., all vectorized over the steps.
+    Missing values, e.g. steps a run did not record, are skipped.
+    """
+
+    def __init__(self, steps: int):
+        self.count = np.zeros(steps)
+        self.mean = np.zeros(steps)
+        self.m2 = np.zeros(steps)  # sum of squared deviations from the mean
+
+    def push(self, values: np.ndarray) -> None:
+        """adding the values of one run"""
+        recorded = ~np.isnan(values)
+        self.count[recorded] += 1
+        delta = values[recorded] - self.mean[recorded]
+        self.mean[recorded] += delta / self.count[recorded]
+        self.m2[recorded] += delta * (values[recorded] - self.mean[recorded])
+
+    def merge(self, other: "StepMoments") -> None:
+        """adding the moments of other runs"""
+        count = self.count + other.count
+        merged = count > 0
+        delta = other.mean[merged] - self.mean[merged]
+        shares = other.count[merged] / count[merged]
+        self.mean[merged] += delta * shares
+        self.m2[merged] += other.m2[merged] + delta**2 * self.count[merged] * shares
+        self.count = count
+
+    @property
+    def variance(self) -> np.ndarray:
+        variance = np.full(len(self.count), np.nan)
+        recorded = self.count > 0
+        variance[recorded] = self.m2[recorded] / self.count[recorded]
+        return variance
+
+
+class StepDigest:
+    """merging digest of the distribution of a variable per time step over runs
+
+    Each step keeps at most `centroids` weighted centroids, a t-digest with the
+    arcsine scale function, so the quantiles in the tails stay accurate while the
+    memory does not grow with the number of runs. All steps are compressed at once.
+    """
+
+    def __init__(self, steps: int, centroids: int = 50):
+        self.centroids = centroids
+        self.means = np.zeros((steps, 0))
+        self.weights = np.zeros((steps, 0))
+
+    def push(self, values: np.ndarray) -> None:
+        """adding the values of one run"""
+        weights = (~np.isnan(values)).astype(float)
+        self.add(np.nan_to_num(values)[:, None], weights[:, None])
+
+    def merge(self, other: "StepDigest") -> None:
+        """adding the centroids of other runs"""
+        self.add(other.means, other.weights)
+
+    def add(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """adding centroids and compressing all centroids of each step"""
+        means = np.hstack([self.means, means])
+        weights = np.hstack([self.weights, weights])
+        if means.shape[1] <= self.centroids:
+            self.means, self.weights = means, weights
+            return
+        order = np.argsort(np.where(weights > 0, means, np.inf), axis=1, kind="stable")
+        means = np.take_along_axis(means, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+        total = weights.sum(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            quantiles = (np.cumsum(weights, axis=1) - weights / 2) / total
+        # the arcsine scale function assigns narrow quantile ranges to the centroids of the tails
+        buckets = np.floor(
+            self.centroids * (np.arcsin(2 * np.nan_to_num(quantiles) - 1) / np.pi + 0.5)
+        ).clip(0, self.centroids - 1)
+        index = (
+            (np.arange(len(means))[:, None] * self.centroids + buckets)
+            .astype(np.int64)
+            .ravel()
+        )
+        size = len(means) * self.centroids
+        weightSums = np.bincount(index, weights.ravel(), minlength=size)
+        sums = np.bincount(index, (weights * means).ravel(), minlength=size)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centroidMeans = np.where(weightSums > 0, sums / weightSums, 0)
+        self.means = centroidMeans.reshape(-1, self.centroids)
+        self.weights = weightSums.reshape(-1, self.centroids)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """returning the estimated quantile of each step, interpolated between the centroids"""
+        order = np.argsort(
+            np.where(self.weights > 0, self.means, np.inf), axis=1, kind="stable"
+        )  # ascending centroids, empty ones last
+        means = np.take_along_axis(self.means, order, axis=1)
+        weights = np.take_along_axis(self.weights, order, axis=1)
+        total = weights.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            positions = (np.cumsum(weights, axis=1) - weights / 2) / total[:, None]
+        positions = np.where(weights > 0, positions, np.inf)
+        count = (weights > 0).sum(axis=1)
+        upper = np.minimum((positions < q).sum(axis=1), np.maximum(count - 1, 0))
+        lower = np.maximum(upper - 1, 0)
+        rows = np.arange(len(means))
+        low, high = positions[rows, lower], positions[rows, upper]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(high > low, (q - low) / (high - low), 0).clip(0, 1)
+        values = means[rows, lower] + share * (means[rows, upper] - means[rows, lower])
+        return np.where(total > 0, values, np.nan)
+
+
+class Ensemble:
+    """per step summary of variables over the runs of an ensemble, independent of the number of runs
+
+    Moments are kept for every step and the quantile digests for every
+    `quantileEvery`-th step only, as they hold several centroids per step.
+    """
+
+    def __init__(
+        self,
+        steps: int,
+        variables: dict = ENSEMBLE,
+        centroids: int = 50,
+        quantileEvery: int = 10,
+    ):
+        self.steps = steps
+        self.variables = variables
+        self.quantileEvery = quantileEvery
+        self.runs = 0
+        self.moments = {key: StepMoments(steps + 1) for key in variables}
+        self.digests = {
+            key: StepDigest(len(range(0, steps + 1, quantileEvery)), centroids)
+            for key in variables
+        }
+
+    def add(self, frame: pd.DataFrame) -> None:
+        """adding the model variables of a run indexed by time step"""
+        for key, expression in self.variables.items():
+            values = (
+                frame.eval(expression)
+                .reindex(range(self.steps + 1))
+                .to_numpy(dtype=float)
+            )
+            self.moments[key].push(values)
+            self.digests[key].push(values[:: self.quantileEvery])
+        self.runs += 1
+
+    def merge(self, other: "Ensemble") -> None:
+        """adding the summary of other runs, e.g. of another worker"""
+        for key in self.variables:
+            self.moments[key].merge(other.moments[key])
+            self.digests[key].merge(other.digests[key])
+        self.runs += other.runs
+
+    def summary(self, quantiles: tuple = QUANTILES) -> ap.DataDict:
+        """returning the moments per step and the quantiles per quantile step of all variables"""
+        summary = ap.DataDict()
+        summary["moments"] = pd.concat(
+            {
+                key: pd.DataFrame(
+                    {
+                        "count": moments.count,
+                        "mean": moments.mean,
+                        "variance": moments.variance,
+                    }
+                )
+                for key, moments in self.moments.items()
+            },
+            axis=1,
+        ).rename_axis("t")
+        summary["quantiles"] = pd.concat(
+            {
+                key: pd.DataFrame(
+                    {q: digest.quantile(q) for q in quantiles},
+                    index=range(0, self.steps + 1, self.quantileEvery),
+                )
+                for key, digest in self.digests.items()
+            },
+            axis=1,
+        ).rename_axis("t")
+        summary["runs"] = self.runs
+        return summary
+
+
+def runEnsemble(
+    params: dict, seeds: list, model: ap.Model = ASM, **ensemble
+) -> Ensemble:
+    """running the model for each seed and returning the ensemble summary of the runs"""
+    summary = Ensemble(int(params["steps"]), **ensemble)
+    for seed in seeds:
+        results = model(dict(params, seed=seed)).run(display=False)
+        summary.add(results["variables"][model.__name__])
+    return summary
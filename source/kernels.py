@@ -0,0 +1,132 @@
+from rules import MATCHBITS
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+COMPILED = njit is not None  # whether Numba is installed to compile the kernels
+
+
+def kernel(function):
+    """compiling a kernel with Numba if installed, else keeping the plain Python function"""
+    return njit(cache=True)(function) if COMPILED else function
+
+
+@kernel
+def matchRules(care, value, live, worldMask, active):
+    """writing whether the live rules of all agents match the encoded world state to active"""
+    for i in range(care.shape[0]):
+        for j in range(care.shape[1]):
+            active[i, j] = (
+                live[i, j] and ((value[i, j] ^ worldMask) & care[i, j] & MATCHBITS) == 0
+            )
+
+
+@kernel
+def activateRules(
+    active, errorVariance, activationIndicator, activationCount, currentSlot
+):
+    """counting the activations and selecting the first active rule with the lowest errorVariance of all agents"""
+    for i in range(active.shape[0]):
+        best, lowest = 0, np.inf
+        for j in range(active.shape[1]):
+            if active[i, j]:
+                activationIndicator[i, j] = 1
+                activationCount[i, j] += 1
+                if errorVariance[i, j] < lowest:
+                    best, lowest = j, errorVariance[i, j]
+        currentSlot[i] = best
+
+
+@kernel
+def specialistSearch(
+    currentA,
+    currentB,
+    currentAccuracy,
+    position,
+    cash,
+    forecast,
+    demand,
+    slope,
+    price,
+    dividend,
+    interestRate,
+    dorra,
+    maxBid,
+    minHolding,
+    shares,
+    epsilon,
+    trialsSpecialist,
+    minPrice,
+    maxPrice,
+):
+    """returning price, trials, and excess demand of the specialist's price search over all trials
+
+    Each trial evaluates forecast, constrained demand, and slope of all agents like
+    Population.specialistSteps and sums them in agent order like sequentialSum.
+    """
+    trials, demandDifference = 0, 0.0
+    while trials < trialsSpecialist:
+        trials += 1
+        sumDemand, sumSlope = 0.0, 0.0
+        for i in range(position.shape[0]):
+            denominator = dorra * currentAccuracy[i]
+            forecast[i] = currentA[i] * (price + dividend) + currentB[i]
+            agentDemand = (forecast[i] - price * (1 + interestRate)) / denominator
+            slope[i] = (currentA[i] - (1 + interestRate)) / denominator
+            # constraining the demand to the maximum bid and the minimum holding
+            consumption = agentDemand - position[i]
+            if consumption > maxBid:
+                agentDemand = maxBid + position[i]
+            elif consumption < -maxBid:
+                agentDemand = -maxBid + position[i]
+            if agentDemand > 0 and agentDemand * price > cash[i]:
+                agentDemand = cash[i] / price if cash[i] > 0 else 0.0
+            elif agentDemand < 0 and agentDemand + position[i] < minHolding:
+                agentDemand = minHolding
+            demand[i] = agentDemand
+            sumDemand += agentDemand
+            sumSlope += slope[i]
+        demandDifference = sumDemand - shares
+        if abs(demandDifference) < epsilon:
+            break
+        if sumSlope != 0:
+            price -= demandDifference / sumSlope
+        else:
+            price *= 1 + 0.0005 * demandDifference
+        price = (
+            minPrice if price < minPrice else (maxPrice if price > maxPrice else price)
+        )
+    return price, trials, demandDifference
+
+
+@kernel
+def updatePredictors(
+    errorVariance, prevForecast, a, b, prevActive, active, priceDividend, theta
+):
+    """updating the errorVariance of the previously and the forecast of the currently active predictors"""
+    for i in range(errorVariance.shape[0]):
+        for j in range(errorVariance.shape[1] - 1):  # excluding the default slot
+            if prevActive[i, j]:
+                error = priceDividend - prevForecast[i, j]
+                errorVariance[i, j] = (1 - theta) * errorVariance[i, j] + theta * (
+                    error * error
+                )
+            if active[i, j]:
+                prevForecast[i, j] = a[i, j] * priceDividend + b[i, j]
+
+
+@kernel
+def settleTrades(demand, position, cash, wealth, price, dividend, interestRate):
+    """settling the trades and paying dividends and interest of all agents, returning the traded volume"""
+    volume = 0.0
+    for i in range(demand.shape[0]):
+        volume += abs(position[i] - demand[i])
+        cash[i] = cash[i] - (demand[i] - position[i]) * price
+        cash[i] = cash[i] + position[i] * (dividend - interestRate * price)
+        position[i] = demand[i]
+        wealth[i] = cash[i] + position[i] * price
+    return volume
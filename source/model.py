@@ -1,8 +1,22 @@
 from agents import MarketStatistician as MS
+from population import Population, PopulationStatistician as PS, sequentialSum
+from clearing import clearingPrice
+from streams import RandomStreams
+from running_stats import RunningVariance, RollingMean
+from recorder import Recorder, addIndexColumns
+from writer import ChunkWriter, loadStream
+from checkpoint import saveCheckpoint, loadCheckpoint, restoreCheckpoint, readRules
+from profiler import PhaseProfiler, NoProfiler
+from store import Store, isStore, loadDataDict
+from convergence import ConvergenceMonitor
+from telemetry import TelemetryBuffer, TelemetryServer, TELEMETRY
 
+from agentpy.tools import make_list
 import agentpy as ap
 import numpy as np
 import math
+import glob
+import os
 
 np.seterr("raise")
 
@@ -10,18 +24,68 @@ np.seterr("raise")
 class ArtificialStockMarket(ap.Model):
     def setup(self: ap.Model):
         """setup function initializing and declaring class specific variables"""
-        if self.p.mode == 3:
-            # importing data from previous experiment based on specified path
-            self.importedDataDict = self.readDataDict(dataDictPath=self.p.importPath)
-        self.hreeRandom = (
-            self.randomGenerator()
+        self.rng = RandomStreams(
+            self, legacy=self.p.rng == "legacy"
+        )  # initializing random streams of the model and its agents
+        self.profiler = (
+            PhaseProfiler(memory=self.p.profile == "memory")
+            if self.p.profile
+            else NoProfiler()
+        )  # timing the phases of each step if profiling is enabled
+        self.recorder = Recorder(
+            steps=int(self._steps),
+            policies=self.p.recording,
+            writer=self.streamWriter(),
+            sparse=None
+            if self.p.burnIn is None
+            else (self.p.burnIn, self.p.sparseEvery),
+        )  # initializing preallocated columns of recorded variables
+        self.monitor = (
+            ConvergenceMonitor(self.p.convergence, self.p.convergenceWindow)
+            if self.p.convergence
+            else None
+        )  # watching windowed statistics after the burn-in if convergence criteria are given
+        self.stopReason = "steps"  # reason for the end of the run
+        self.telemetry, self.telemetryServer = None, None
+        if self.p.telemetry is not None:
+            # serving the recent values of the market from a local endpoint while running
+            self.telemetry = TelemetryBuffer(self.p.telemetrySize)
+            self.telemetryServer = TelemetryServer(
+                self.telemetry,
+                self.p.telemetry.format(run=self.runName()),
+                run=self.runName(),
+            )
+            print(f"Telemetry of {self.runName()} at {self.telemetryServer.address}")
+        self.checkpoint = (
+            self.readCheckpoint() if self.p.mode == 3 else None
+        )  # checkpoint of a previous run to resume from in mode 3
+        self.importedStore = (
+            None  # compact results of a previous experiment to import rules from
+        )
+        if self.p.mode == 3 and self.checkpoint is None:
+            if isStore(self.p.importPath):
+                # importing rules stored as arrays
+                self.importedStore = Store(self.p.importPath)
+            else:
+                # importing data from previous experiment based on specified path
+                self.importedDataDict = self.readDataDict(
+                    dataDictPath=self.p.importPath
+                )
+        self.hreeRandom = self.rng.generator(
+            "hree"
         )  # initializing random generator for h.r.e.e. processes
-        self.dividendRandom = (
-            self.randomGenerator()
+        self.dividendRandom = self.rng.generator(
+            "dividend"
         )  # initializing random generator for dividend process
         self.theta = (
             1 / 75 if self.p.forecastAdaptation else 1 / 150
         )  # specifying theta for given regimes based on forecastAdaptation
+        self.pdVariance = (
+            RunningVariance()
+        )  # running variance of price plus dividend up until current period
+        self.priceMA = {
+            periods: RollingMean(periods) for periods in [5, 10, 100, 500]
+        }  # moving averages of the price for the technical conditions
         self.dividend = self.p.averageDividend  # calculating initial dividend value
         self.price = 80  # specifying initial price value
         self.hreePrice = (
@@ -31,53 +95,99 @@ class ArtificialStockMarket(ap.Model):
         self.worldState = (
             self.worldInformation()
         )  # observing state of the world based on fundamental, technical, and constant conditions
-        self.agents = ap.AgentList(self, self.p.N, MS)  # initializing agents
+        self.worldMask = (
+            self.encodeWorldState()
+        )  # encoding the state of the world as integer bitmask for rule activation
+        self.population = (
+            Population(self) if self.p.engine == "population" else None
+        )  # initializing population arrays if agents are simulated as arrays
+        self.agents = ap.AgentList(
+            self, self.p.N, MS if self.population is None else PS
+        )  # initializing agents
+        self.recorder.register(
+            self.agents.id
+        )  # assigning agents to rows of the recorder
+        if self.checkpoint is not None:
+            restoreCheckpoint(
+                self, self.checkpoint
+            )  # resuming the state of the previous run
 
     def randomGenerator(self: ap.Model) -> np.random.Generator:
-        """returning a random generator"""
-        seed = self.model.random.getrandbits(self.p.seed)
+        """returning a new random generator seeded from the model's random module (legacy streams)
+
+        The number of random bits follows the seed of the streams, which is kept when
+        resuming from a checkpoint, so resumed runs draw like the uninterrupted run.
+        """
+        seed = self.model.random.getrandbits(self.rng.seed)
         return np.random.default_rng(seed=seed)
 
     def step(self: ap.Model):
         """model centered timeline followed at each timestep"""
-        self.dividend = (
-            self.dividend_process()
-        )  # calculating dividend for current period
-        self.worldState = (
-            self.worldInformation()
-        )  # observing state of the world based on fundamental, technical, and constant conditions
-        self.agents.step()  # activating world state matching predictors of agents
-        self.specialistPriceCalc()  # iterative specialist price determination for current period
-        self.agents.update()  # updating agent specific variables
-        self.agents.document()  # documenting agent specific variables
-        self.document()  # documenting model specific variables
+        if self.p.earlyStop and self.monitor is not None and self.monitor.stable:
+            # ending the run with this step, which is recorded as its last step
+            self.stop()
+            self.recorder.stop(self.t)
+            self.stopReason = "converged: " + self.monitor.reason()
+        phase = self.profiler.phase
+        with phase("dividend_process"):
+            self.dividend = (
+                self.dividend_process()
+            )  # calculating dividend for current period
+        with phase("worldInformation"):
+            self.worldState = (
+                self.worldInformation()
+            )  # observing state of the world based on fundamental, technical, and constant conditions
+            self.worldMask = (
+                self.encodeWorldState()
+            )  # encoding the state of the world as integer bitmask for rule activation
+        if self.population is None:
+            with phase("agents.step"):
+                self.agents.step()  # activating world state matching predictors of agents
+            with phase("specialistPriceCalc"):
+                self.specialistPriceCalc()  # iterative specialist price determination for current period
+            with phase("agents.update"):
+                self.aggregatedVolume = (
+                    0  # summing up traded shares of agents during their update
+                )
+                self.agents.update()  # updating agent specific variables
+        else:
+            with phase("agents.step"):
+                self.population.step()  # activating world state matching predictors of all agents at once
+            with phase("specialistPriceCalc"):
+                self.specialistPriceCalc()  # iterative specialist price determination for current period
+            with phase("agents.update"):
+                self.population.update()  # updating agent specific variables of all agents at once
+        self.profiler.trials += self.specialistTrials
+        with phase("agents.document"):
+            if self.population is None:
+                self.agents.document()  # documenting agent specific variables
+            else:
+                self.population.document()  # documenting variables of all agents at once
+        with phase("document"):
+            self.document()  # documenting model specific variables
 
     def document(self: ap.Model):
         """documenting relevant variables of the model"""
         if self.t > 0:
             # documenting variables for all timesteps except the first one
-            self.record("avgForecast", np.average(self.agents.forecast))
-            self.record("avgDemand", np.average(self.agents.demand))
-            self.record("avgWealth", np.average(self.agents.wealth))
-            self.record("avgPosition", np.average(self.agents.position))
+            self.record("avgForecast", np.average(self.agentVariable("forecast")))
+            self.record("avgDemand", np.average(self.agentVariable("demand")))
+            self.record("avgWealth", np.average(self.agentVariable("wealth")))
+            self.record("avgPosition", np.average(self.agentVariable("position")))
+            self.avgBitsUsed = np.average(self.agentVariable("bitsUsed"))
+            self.record(["avgBitsUsed"])
+            self.record("sumBitsUsed", sum(self.agentVariable("bitsUsed")))
             self.record(
-                "avgBitsUsed",
-                np.average(
-                    [sublist[-1] for sublist in self.agents.log.get("bitsUsed")]
-                ),
+                "sumFundamentalBitsUsed", sum(self.agentVariable("fundamentalBitsUsed"))
             )
+            self.record("avgSpecificity", np.average(self.agentVariable("specificity")))
+            self.record(["specialistTrials", "demandDifference"])
             self.record(
-                "sumBitsUsed",
-                sum(sublist[-1] for sublist in self.agents.log.get("bitsUsed")),
-            )
-            if self.t > 1:
-                self.record(
-                    "aggregatedVolume",
-                    sum(
-                        abs(sublist[-2] - sublist[-1])
-                        for sublist in self.agents.log.get("position")
-                    ),
-                )
+                "trialsSaved", self.p.trialsSpecialist - self.specialistTrials
+            )  # trials of the specialist not needed for market clearing
+            if self.t > 1 or self.checkpoint is not None:
+                # volume of the first step is only meaningful after previous trades
+                self.record(["aggregatedVolume"])
         self.hreePrice = (
             self.hreePriceCalc()
         )  # calculating h.r.e.e. price for current period
@@ -91,37 +201,189 @@ class ArtificialStockMarket(ap.Model):
         )
         self.record("pd", self.price + self.dividend)
 
+        self.pdVariance.push(self.price + self.dividend)
+        for movingAverage in self.priceMA.values():
+            movingAverage.push(self.price)
         self.update()
         self.record(["varPriceDividend"])
+        if self.monitor is not None and self.t > (self.p.burnIn or 0):
+            self.monitor.observe(
+                self
+            )  # observing the windowed statistics after the burn-in
+        if self.telemetry is not None:
+            self.telemetry.push(
+                self.t, [getattr(self, key, np.nan) for key in TELEMETRY]
+            )
 
     def update(self: ap.Model):
         """updating central variables of the model"""
         # updating variance of price plus dividend up until current period
-        self.varPriceDividend = np.var(
-            np.array(self.log.get("dividend") + np.array(self.log.get("price")))
-        )
+        self.varPriceDividend = self.pdVariance.variance
+
+    def agentVariable(self: ap.Model, key: str):
+        """returning the current values of a variable of all agents"""
+        if self.population is None:
+            return getattr(self.agents, key)
+        return getattr(self.population, key)
 
     def end(self: ap.Model):
         """end function for model"""
         self.agents.end()
+        if self.p.ruleCache:
+            # reporting the lookups of matching rules answered by the caches
+            caches = {
+                id(agent.rules.cache): agent.rules.cache
+                for agent in self.agents
+                if agent.rules.cache is not None
+            }.values()
+            self.report("ruleCacheHits", sum(cache.hits for cache in caches))
+            self.report("ruleCacheMisses", sum(cache.misses for cache in caches))
+        for key, value in self.recorder.aggregates().items():
+            # reporting variables recorded as aggregates only
+            self.report(key, value)
+        if self.monitor is not None:
+            # reporting the last step, why the run ended there, and when its statistics settled
+            self.report("stopStep", self.t)
+            self.report("stopReason", self.stopReason)
+            self.report("convergedStep", self.monitor.convergedStep)
+        rules = {}
+        if self.recorder.writer is not None and self.recorder.recording("rules"):
+            # the rules as strings are only built for streamed runs, as they are large for many agents
+            rules = {agent.id: str(agent.rules.toDict()) for agent in self.agents}
+        self.recorder.close(
+            rules=rules,
+            t=self.t,
+            reporters=self.reporters,
+            parameters=dict(self.p),
+        )  # writing the last chunks and final objects of a streamed run
+        self.profiler.close()
+        if self.telemetryServer is not None:
+            self.telemetryServer.close()
+        if self.p.profile and self.p.profilePath is not None:
+            # exporting the trace of all timed phases
+            self.profiler.export(
+                os.path.join(self.p.profilePath, self.runName() + ".json")
+            )
+        if self.p.checkpointPath is not None:
+            # saving the state of the model to resume from in a following run
+            saveCheckpoint(
+                self, os.path.join(self.p.checkpointPath, self.runName() + ".npz")
+            )
+
+    def indexColumns(self: ap.Model) -> dict:
+        """returning the additional index columns of agentpy for runs of experiments"""
+        columns = {}
+        if self._run_id is not None:
+            if self._run_id[0] is not None:
+                columns["sample_id"] = self._run_id[0]
+            if len(self._run_id) > 1 and self._run_id[1] is not None:
+                columns["iteration"] = self._run_id[1]
+        return columns
+
+    def runName(self: ap.Model) -> str:
+        """returning the name of the run's files based on its index columns"""
+        return "_".join(
+            ["run"] + [str(value) for value in self.indexColumns().values()]
+        )
+
+    def streamWriter(self: ap.Model) -> ChunkWriter | None:
+        """returning the writer streaming recorded variables of this run to disk, if enabled"""
+        if self.p.streamPath is None:
+            return None
+        return ChunkWriter(
+            os.path.join(self.p.streamPath, self.runName()),
+            chunk=self.p.streamChunk,
+            columns=self.indexColumns(),
+        )
+
+    def record(self: ap.Model, var_keys, value=None):
+        """recording variables of the model in the columns of the recorder"""
+        for key in make_list(var_keys):
+            self.recorder.record(
+                self.t, key, getattr(self, key) if value is None else value
+            )
+
+    def create_output(self: ap.Model):
+        """creating the output of agentpy and adding the variables of the recorder"""
+        super().create_output()
+        if "variables" not in self.output:
+            self.output["variables"] = ap.DataDict()
+        variables = self.output["variables"]
+        frames = []
+        if self.recorder.writer is None or self.p.streamOutput:
+            # streamed variables are only read back on request, as they hold the whole history
+            frames = [
+                (self.type, self.recorder.modelFrame()),
+                ("MarketStatistician", self.recorder.agentFrame()),
+            ]
+        for objType, frame in frames:
+            frame = addIndexColumns(frame, self.indexColumns())
+            if objType in variables:
+                # joining objects recorded by agentpy, like the rules at the end
+                frame = frame.join(variables[objType], how="outer")
+            variables[objType] = frame
+        if self.p.profile:
+            # summary of the timed phases of this run
+            self.output["profile"] = addIndexColumns(
+                self.profiler.summary(), self.indexColumns()
+            )
+
+    def readCheckpoint(self: ap.Model) -> dict | None:
+        """reading the checkpoint at importPath or the checkpoint of this run in the importPath directory"""
+        path = self.p.importPath
+        if not path.endswith(".npz"):
+            path = os.path.join(path, self.runName() + ".npz")
+        return loadCheckpoint(path) if os.path.isfile(path) else None
+
+    def checkpointRules(self: ap.Model, objId: int):
+        """returning the rule table of an agent from the checkpoint"""
+        return readRules(self.checkpoint, objId, numRules=self.p.M)
+
+    def storedRules(self: ap.Model, objId: int):
+        """returning the rule table of an agent from the store of a previous experiment"""
+        run = self.runName()
+        table = self.importedStore.ruleTable(objId, run)
+        if self._run_id is not None and self._run_id[0] is not None:
+            # adding the previous forecast for the last price and dividend of the run
+            pt = self.importedStore.series("price", run).iloc[-1]
+            dt = self.importedStore.series("dividend", run).iloc[-1]
+            live = table.live
+            table.prevForecast[live] = table.a[live] * (pt + dt) + table.b[live]
+        return table
 
     def readDataDict(self: ap.Agent, dataDictPath: str) -> dict:
         """reading data from dict of previous experiment"""
-        exp_name, exp_id = dataDictPath.rsplit("_", 1)
-        path, exp_name = exp_name.rsplit("/", 1)
-        return ap.DataDict.load(
-            exp_name=exp_name, exp_id=exp_id, path=path, display=False
-        )
+        if glob.glob(os.path.join(dataDictPath, "run*", "meta.json")):
+            # reading results streamed to disk during the previous experiment
+            return loadStream(dataDictPath)
+        return loadDataDict(dataDictPath)
 
     def specialistPriceCalc(self: ap.Model):
+        if self.p.clearing == "exact":
+            return self.clearingPriceCalc()
+        if self.population is not None and self.population.compiled:
+            # running all trials of the specialist in one compiled kernel
+            (
+                self.price,
+                self.specialistTrials,
+                self.demandDifference,
+            ) = self.population.specialistSearch()
+            return
         trialsSpecialist = 0
         while trialsSpecialist < self.p.trialsSpecialist:
             trialsSpecialist += 1
-            self.agents.specialistSteps()  # activating specialist steps of agents
-            sumDemand = sum(
-                self.agents.demand
-            )  # calculating sum of demand of all agents
-            sumSlope = sum(self.agents.slope)  # calculating sum of slope of all agents
+            if self.population is None:
+                self.agents.specialistSteps()  # activating specialist steps of agents
+                sumDemand = sum(
+                    self.agents.demand
+                )  # calculating sum of demand of all agents
+                sumSlope = sum(
+                    self.agents.slope
+                )  # calculating sum of slope of all agents
+            else:
+                self.population.specialistSteps()  # specialist steps of all agents at once
+                sumDemand = sequentialSum(self.population.demand)
+                sumSlope = sequentialSum(self.population.slope)
             demandDifference = (
                 sumDemand - self.p.N
             )  # calculating difference between sum of demand and number of shares of the asset
@@ -140,6 +402,29 @@ class ArtificialStockMarket(ap.Model):
                 if self.price < self.p.minPrice
                 else (self.p.maxPrice if self.price > self.p.maxPrice else self.price)
             )
+        self.specialistTrials = trialsSpecialist  # trials used for market clearing
+        self.demandDifference = (
+            demandDifference  # remaining excess demand of last trial
+        )
+
+    def clearingPriceCalc(self: ap.Model):
+        """exact market clearing based on the piecewise demand functions of all agents"""
+        if self.population is None:
+            alpha, beta, position, cash = np.array(
+                [agent.demandCoefficients() for agent in self.agents]
+            ).T
+        else:
+            alpha, beta, position, cash = self.population.demandCoefficients()
+        self.price = clearingPrice(alpha, beta, position, cash, self.p, self.price)
+        # evaluating the demand of all agents once at the clearing price
+        if self.population is None:
+            self.agents.specialistSteps()
+            sumDemand = sum(self.agents.demand)
+        else:
+            self.population.specialistSteps()
+            sumDemand = sequentialSum(self.population.demand)
+        self.specialistTrials = 1
+        self.demandDifference = sumDemand - self.p.N
 
     def dividend_process(self: ap.Model) -> float:
         """returning current dividend based on AR(1) process"""
@@ -154,7 +439,6 @@ class ArtificialStockMarket(ap.Model):
     def worldInformation(self: ap.Model) -> dict:
         """returning the fundamental, technical, and constant state of the world"""
         fundamentalValues = [0.25, 0.5, 0.75, 0.875, 1.0, 1.25]
-        technicalValues = [self.technicalMA(periods) for periods in [5, 10, 100, 500]]
         constantConditions = {11: 1, 12: 0}
 
         fundamentalConditions = {
@@ -162,14 +446,19 @@ class ArtificialStockMarket(ap.Model):
             for idx, fundamental in zip(range(1, 7), fundamentalValues)
         }
         technicalConditions = {
-            idx: self.price > MA for idx, MA in zip(range(7, 11), technicalValues)
-        }
+            idx: self.priceMA[periods].below(self.price)
+            for idx, periods in zip(range(7, 11), [5, 10, 100, 500])
+        }  # whether the price is above its moving averages
 
         return fundamentalConditions | technicalConditions | constantConditions
 
+    def encodeWorldState(self: ap.Model) -> int:
+        """returning the worldState as integer with bit (i - 1) set if condition i holds"""
+        return sum(1 << (bitID - 1) for bitID, bit in self.worldState.items() if bit)
+
     def technicalMA(self: ap.Model, periodMA) -> float:
         """returning the moving average for a certain period (input)"""
-        return np.average(self.log.get("price")[-periodMA:])
+        return self.priceMA[periodMA].mean
 
     def hreePriceCalc(self: ap.Model) -> float:
         """Returns h.r.e.e. price for current period. Formula is based on Ehrentreich2008 p.102f."""
@@ -1,12 +1,37 @@
 parameters = {
     "experimentSplit": 1,  # binary with 0 for no split and 1 for split
     "batches": 25,  # number of batches for split experiment
-    "importPath": r"results/ASM_50000_30082023-133915",  # path to innate rules if mode == 3
+    "importPath": r"results/ASM_50000_30082023-133915",  # path to innate rules if mode == 3, a checkpoint file (.npz) or directory of checkpoints resumes the runs
+    "checkpointPath": None,  # directory for a checkpoint of each run's final state [str] to resume from in mode 3, or none [None]
     "seed": 42,  # seed for random number generator
+    "rng": "philox",  # Philox streams per agent and purpose ["philox"] or reproducing former results ["legacy"]
     "forecastAdaptation": 0,  # binary with 0 for slow/re and 1 for fast/complex
     "mode": 0,  # with standard mode [0], diagnostics test "clamped" hree predictors [1],
     # diagnostics test hree adaptation [2], and innating rules (pre-trained rules) [3]
+    "engine": "agents",  # simulating each agent as MarketStatistician ["agents"] or all agents as arrays ["population"]
     "steps": 2.5e5,  # num of steps/iterations by the model
+    "recording": (),  # recording policies per variable, e.g. (("utility", "off"), ("cash", 10, "float32")): each step ["step"] (default),
+    # every k-th and the last step [k], only mean, min, max, and last value as reporters ["aggregate"], or not at all ["off"]
+    "streamPath": None,  # directory for streaming recorded variables to disk during the run [str] or keeping them in memory [None]
+    "streamOutput": False,  # reading the streamed variables back into the output of the run [True] or leaving them on disk for loadStream [False]
+    "streamChunk": 1000,  # recorded rows per chunk written to disk when streaming
+    "burnIn": None,  # steps after which all variables are recorded only every sparseEvery-th step [int] or full recording throughout [None]
+    "sparseEvery": 100,  # steps between the recorded steps after the burn-in
+    "convergence": (),  # stability criteria as (statistic, tolerance) entries, e.g. (("avgBitsUsed", 0.02), ("hreeGap", 0.05), ("returnVariance", 0.1)),
+    # met once the statistics of the last convergenceWindow steps after the burn-in differ relatively by at most the tolerances from the preceding window
+    "convergenceWindow": 5000,  # steps per window of the convergence statistics
+    "earlyStop": False,  # stopping a run once all convergence criteria are met [True] or running all steps [False]
+    "kernels": False,  # running the population engine's loops as kernels compiled by Numba if installed [True] or as NumPy procedures [False]
+    "defaultPredictor": "table",  # default rule established in the rule table from all rules whenever it is used ["table"],
+    # or kept outside the table, averaged after each genetic algorithm, and used only if no rule matches ["separate"]
+    "ruleStorage": "float64",  # rule fields of the population engine in double precision ["float64"],
+    # or the rule statistics in single precision and counters and conditions as narrow integers, less than half of the memory ["float32"]
+    "ruleCache": True,  # memoizing the matching rules per world state [True] or matching all conditions each step [False]
+    "telemetry": None,  # local endpoint serving the recent market variables and steps per second while running, "host:port" over HTTP
+    # or the path of a Unix socket, with "{run}" replaced by the run name [str], or no telemetry [None]
+    "telemetrySize": 1000,  # recent steps kept for the telemetry
+    "profile": False,  # timing the phases of each step [True], additionally tracing memory with tracemalloc ["memory"], or not profiling [False]
+    "profilePath": None,  # directory for the trace of the timed phases of each run [str] or no export [None]
     "N": 25,  # num of agents & num of assets
     "averageDividend": 10,  # \bar{d} in the paper
     "autoregressiveParam": 0.95,  # \rho in the paper
@@ -20,6 +45,7 @@ parameters = {
     "minCash": 0,  # minimum cash owned by each agent
     "epsilon": 1e-2,  # maximum deviation in specialist's market clearing
     "trialsSpecialist": 10,  # trials per timestep for market clearing
+    "clearing": "specialist",  # iterative specialist ["specialist"] or exact piecewise market clearing ["exact"]
     "maxBid": 10,  # maximum bid of each agent to the risky-asset
     "minPrice": 0.01,  # minimum price for market clearing for specialist
     "maxPrice": 500,  # maximum price for market clearing for specialist
@@ -0,0 +1,382 @@
+from agents import MarketStatistician, triggerFires
+from rules import RuleTable, MatchCache, FIELDS, COMPACTFIELDS, COMPACTCONDITION
+import kernels
+
+import agentpy as ap
+import numpy as np
+import warnings
+
+STATE = [
+    "cash",
+    "position",
+    "demand",
+    "slope",
+    "forecast",
+    "wealth",
+    "utility",
+]  # agent variables stored as one array over the population
+
+
+def sequentialSum(values: np.ndarray) -> float | np.ndarray:
+    """summing over the last axis in agent order like the built-in sum over the agent list"""
+    return np.cumsum(values, axis=-1)[..., -1]
+
+
+class Population:
+    """struct-of-arrays state of all market statisticians of a market
+
+    The rule fields of all agents are stored as (N, M + 1) arrays and the agent
+    variables as (N,) arrays. Each agent's rule table is a set of row views on these
+    arrays, so agent specific procedures like the genetic algorithm keep working,
+    while rule activation, demand calculation and updates run for all agents at once.
+    The procedures work on the last axes, so the arrays may carry leading axes, e.g.
+    for the replicas of a batch, with price and dividend broadcasting against them.
+    With kernels set, the loops over all agents and rules run as kernels compiled
+    by Numba instead, if Numba is installed. With the float32 rule storage, the rule
+    statistics are stored in single precision and the counters and conditions as
+    narrow integers, while all calculations with them run in double precision.
+    """
+
+    def __init__(self, model: ap.Model):
+        self.model = model
+        N, M = model.p.N, model.p.M
+        compact = model.p.ruleStorage == "float32"
+        self.rules = {
+            key: np.zeros((N, M + 1), dtype=dtype)
+            for key, dtype in (COMPACTFIELDS if compact else FIELDS).items()
+        }
+        conditionType = COMPACTCONDITION if compact else np.int64
+        self.rules["care"] = np.zeros((N, M + 1), dtype=conditionType)
+        self.rules["value"] = np.zeros((N, M + 1), dtype=conditionType)
+        self.rules["live"] = np.zeros((N, M + 1), dtype=bool)
+        for key in STATE:
+            setattr(self, key, np.zeros(N))
+        self.counts = np.zeros(
+            (N, 3), dtype=np.int64
+        )  # technical, fundamental, and all specified bits of each agent's rules
+        self.currentSlot = np.zeros(N, dtype=np.int64)  # slot of the current rule
+        self.active = np.zeros((N, M + 1), dtype=bool)  # currently active rules
+        self.prevActive = np.zeros((N, M + 1), dtype=bool)  # previously active rules
+        self.members = []  # agents in order of their rows
+        self.ids = []  # ids of the agents in order of their rows
+        self.cache = MatchCache(
+            self.rules["care"], self.rules["value"], self.rules["live"]
+        )  # matching rules of all agents per world state
+        if model.p.kernels and not kernels.COMPILED:
+            warnings.warn(
+                "Numba is not installed, running the NumPy procedures instead of the kernels"
+            )
+        self.compiled = (
+            model.p.kernels and kernels.COMPILED
+        )  # running the compiled kernels
+
+    def register(self, agent: ap.Agent) -> int:
+        """registering an agent and returning its row in the population arrays"""
+        self.members.append(agent)
+        self.ids.append(agent.id)
+        return len(self.members) - 1
+
+    def adoptRules(self, index: int, table: RuleTable) -> RuleTable:
+        """copying a rule table into the population arrays and returning a view on its row"""
+        for key, array in self.rules.items():
+            array[index] = getattr(table, key)
+        self.cache.clear()
+        return self.rowTable(index)
+
+    def rowTable(self, index: int) -> RuleTable:
+        """returning the rule table of an agent as view on its row of the population arrays"""
+        table = RuleTable(
+            numRules=self.model.p.M,
+            fields={key: array[index] for key, array in self.rules.items()},
+            counts=self.counts[index],
+        )
+        table.cache, table.cacheIndex = self.cache, (
+            index,
+        )  # sharing the population's cache
+        return table
+
+    def bind(self, rules: dict):
+        """moving the rule arrays to the given arrays of the same shape, e.g. views on the arrays of a batch"""
+        for key, array in rules.items():
+            array[...] = self.rules[key]
+        self.rules = rules
+        self.cache.care, self.cache.value, self.cache.live = (
+            rules["care"],
+            rules["value"],
+            rules["live"],
+        )  # keeping the cached world states
+        for agent in self.members:
+            agent._rules = self.rowTable(agent.index)
+
+    def matching(self) -> np.ndarray:
+        """returning the live rules of all agents matching the current world state"""
+        if self.model.p.ruleCache:
+            return self.cache.lookup(self.model.worldMask).copy()
+        if self.compiled:
+            active = np.empty(self.rules["live"].shape, dtype=bool)
+            kernels.matchRules(
+                self.rules["care"],
+                self.rules["value"],
+                self.rules["live"],
+                self.model.worldMask,
+                active,
+            )
+            return active
+        return self.cache.match(self.model.worldMask)
+
+    def step(self):
+        """activating the rules matching the worldState and selecting the current rule of all agents"""
+        rules, M = self.rules, self.model.p.M
+        self.prevActive = self.active
+        self.active = self.matching()
+        if self.compiled:
+            self.currentSlot = np.zeros(self.active.shape[:-1], dtype=np.int64)
+            kernels.activateRules(
+                self.active,
+                rules["errorVariance"],
+                rules["activationIndicator"],
+                rules["activationCount"],
+                self.currentSlot,
+            )
+        else:
+            rules["activationIndicator"][self.active] = 1
+            rules["activationCount"] += self.active
+            # the first active rule with the lowest errorVariance becomes the current rule
+            self.currentSlot = np.where(
+                self.active, rules["errorVariance"], np.inf
+            ).argmin(axis=-1)
+        active = self.active.reshape(-1, M + 1)  # views with one row per agent
+        currentSlot = self.currentSlot.reshape(-1)
+        defaults = np.flatnonzero(~active.any(axis=1) | (currentSlot == M))
+        if self.model.p.defaultPredictor == "table":
+            for index in defaults:
+                # if no rule is activated, the default rule is established and activated
+                self.members[index].rules.setDefault()
+        active[defaults] = False
+        active[defaults, M] = True
+        currentSlot[defaults] = M
+        slots = self.currentSlot[..., None]
+        self.currentA, self.currentB, self.currentAccuracy = (
+            np.take_along_axis(rules[key], slots, axis=-1)[..., 0].astype(
+                np.float64, copy=False
+            )
+            for key in ["a", "b", "accuracy"]
+        )  # the current predictors in double precision, also with the float32 rule storage
+
+    def specialistSteps(self):
+        """calculating forecast, demand, and slope of all agents for the current price"""
+        p = self.model.p
+        self.forecast = self.currentA * (self.model.price + self.model.dividend) + (
+            self.currentB
+        )
+        demand = (self.forecast - self.model.price * (1 + p.interestRate)) / (
+            p.dorra * self.currentAccuracy
+        )
+        self.slope = (self.currentA - (1 + p.interestRate)) / (
+            p.dorra * self.currentAccuracy
+        )
+        self.demand = self.constrainDemand(demand)
+
+    def specialistSearch(self) -> tuple[float, int, float]:
+        """returning price, trials, and excess demand of the specialist's price search run as compiled kernel"""
+        p = self.model.p
+        self.forecast, self.demand, self.slope = (
+            np.zeros(len(self.cash)) for _ in range(3)
+        )
+        return kernels.specialistSearch(
+            self.currentA,
+            self.currentB,
+            self.currentAccuracy,
+            self.position,
+            self.cash,
+            self.forecast,
+            self.demand,
+            self.slope,
+            float(self.model.price),
+            float(self.model.dividend),
+            float(p.interestRate),
+            float(p.dorra),
+            float(p.maxBid),
+            float(p.minHolding),
+            float(p.N),
+            float(p.epsilon),
+            int(p.trialsSpecialist),
+            float(p.minPrice),
+            float(p.maxPrice),
+        )
+
+    def demandCoefficients(
+        self,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """returning intercepts and slopes of the unconstrained demand in the price, positions, and cash"""
+        denominator = self.model.p.dorra * self.currentAccuracy
+        return (
+            (self.currentA * self.model.dividend + self.currentB) / denominator,
+            (self.currentA - (1 + self.model.p.interestRate)) / denominator,
+            self.position,
+            self.cash,
+        )
+
+    def constrainDemand(self, demand: np.ndarray) -> np.ndarray:
+        """constraining the demand to the maximum bid and the minimum holding"""
+        p, price = self.model.p, self.model.price
+        consumption = demand - self.position
+        demand = np.where(
+            consumption > p.maxBid,
+            p.maxBid + self.position,
+            np.where(consumption < -p.maxBid, -p.maxBid + self.position, demand),
+        )
+        exceedingCash = (demand > 0) & ((demand * price) > self.cash)
+        demand = np.where(
+            exceedingCash, np.where(self.cash > 0, self.cash / price, 0), demand
+        )
+        return np.where(
+            ~exceedingCash & (demand < 0) & (demand + self.position < p.minHolding),
+            p.minHolding,
+            demand,
+        )
+
+    def update(self):
+        """updating predictors, performing the genetic algorithm, and settling trades of all agents"""
+        p, M = self.model.p, self.model.p.M
+        price, dividend, theta = self.model.price, self.model.dividend, self.model.theta
+        if self.compiled:
+            kernels.updatePredictors(
+                self.rules["errorVariance"],
+                self.rules["prevForecast"],
+                self.rules["a"],
+                self.rules["b"],
+                self.prevActive,
+                self.active,
+                float(price + dividend),
+                theta,
+            )
+            self.geneticAlgorithms()
+            self.utility = -(np.exp(-p.dorra * (self.demand - self.position)))
+            self.wealth = np.zeros(len(self.cash))
+            self.model.aggregatedVolume = kernels.settleTrades(
+                self.demand,
+                self.position,
+                self.cash,
+                self.wealth,
+                float(price),
+                float(dividend),
+                float(p.interestRate),
+            )
+            return
+        errorVariance = self.rules["errorVariance"][..., :M]
+        prevForecast = self.rules["prevForecast"][..., :M]
+        priceDividend = np.broadcast_to(
+            np.expand_dims(price + dividend, -1), errorVariance.shape
+        )  # price plus dividend for each rule
+
+        # updating the errorVariance of the previously active predictors
+        prevActive = self.prevActive[..., :M]
+        errorVariance[prevActive] = (1 - theta) * errorVariance[
+            prevActive
+        ] + theta * np.square(priceDividend[prevActive] - prevForecast[prevActive])
+
+        # updating the previous forecast of the currently active predictors
+        active = self.active[..., :M]
+        prevForecast[active] = (
+            self.rules["a"][..., :M][active] * priceDividend[active]
+            + self.rules["b"][..., :M][active]
+        )
+
+        self.geneticAlgorithms()
+
+        self.utility = -(np.exp(-p.dorra * (self.demand - self.position)))
+
+        self.model.aggregatedVolume = sequentialSum(np.abs(self.position - self.demand))
+        # cash calculation with taxation based on Ehrentreich (2008) to prevent wealth explosion
+        self.cash = self.cash - (self.demand - self.position) * price
+        self.cash = self.cash + self.position * (dividend - p.interestRate * price)
+        self.position = self.demand.copy()
+        self.wealth = self.cash + self.position * price
+
+    def triggers(self) -> np.ndarray:
+        """returning whether the genetic algorithm of each agent fires, drawn for all agents at once"""
+        blocks = self.model.rng.lockstepBlock("trigger", self.ids, high=1000)
+        return triggerFires(blocks.next(), self.model.p.forecastAdaptation)
+
+    def geneticAlgorithms(self):
+        """performing the genetic algorithm of all agents whose trigger fires"""
+        if self.model.p.rng == "legacy":
+            # drawing each trigger from a new generator in agent order
+            for agent in self.members:
+                agent.geneticAlgorithmTrigger()
+            return
+        for index in np.flatnonzero(self.triggers()):
+            self.members[index].evolveRules()
+
+    def document(self):
+        """documenting relevant variables of all agents at once"""
+        # numbers of technical, fundamental, and all specified bits used by all rules of each agent
+        self.bitsUsed, self.fundamentalBitsUsed, self.specificity = self.counts.T
+        for key in [
+            "bitsUsed",
+            "fundamentalBitsUsed",
+            "specificity",
+            "forecast",
+            "demand",
+            "cash",
+            "wealth",
+            "position",
+            "utility",
+        ]:
+            self.model.recorder.recordAgents(self.model.t, key, getattr(self, key))
+
+
+def populationAttribute(key: str) -> property:
+    """returning a property mapping an agent variable onto its entry in the population arrays"""
+
+    def getter(self):
+        return getattr(self.model.population, key)[self.index]
+
+    def setter(self, value):
+        getattr(self.model.population, key)[self.index] = value
+
+    return property(getter, setter)
+
+
+class PopulationStatistician(MarketStatistician):
+    """market statistician whose variables and rules live in the population arrays of the model"""
+
+    def setup(self):
+        """registering the agent with the population before the regular setup"""
+        self.type = "MarketStatistician"  # recording variables like regular agents
+        self.index = self.model.population.register(self)
+        super().setup()
+
+    cash = populationAttribute("cash")
+    position = populationAttribute("position")
+    demand = populationAttribute("demand")
+    slope = populationAttribute("slope")
+    forecast = populationAttribute("forecast")
+    wealth = populationAttribute("wealth")
+    utility = populationAttribute("utility")
+
+    @property
+    def rules(self) -> RuleTable:
+        return self._rules
+
+    @rules.setter
+    def rules(self, table: RuleTable):
+        self._rules = self.model.population.adoptRules(self.index, table)
+
+    @property
+    def currentRule(self) -> int:
+        return int(self._rules.ruleIDs[self.model.population.currentSlot[self.index]])
+
+    @currentRule.setter
+    def currentRule(self, ruleID: int):
+        self.model.population.currentSlot[self.index] = self._rules.slot(ruleID)
+
+    @property
+    def activeRules(self) -> np.ndarray:
+        return self._rules.ruleIDs[self.model.population.active[self.index]]
+
+    @activeRules.setter
+    def activeRules(self, ruleIDs: np.ndarray):
+        self.model.population.active[self.index] = False
+        self.model.population.active[self.index, self._rules.slot(ruleIDs)] = True
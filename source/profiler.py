@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+class PhaseProfiler:
+    """timer of the phases of each step, e.g. rule activation or the specialist's price search
+
+    Phases may be nested, like the genetic algorithm within the update of the agents,
+    so every phase reports its total time and its own time without nested phases.
+    With memory set, the change in allocated Python memory blocks and in memory
+    traced by tracemalloc (including NumPy arrays) is counted besides the time,
+    which slows the phases down considerably. Every call is kept as event of the trace.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.tracing = (
+            memory and not tracemalloc.is_tracing()
+        )  # tracing started by this profiler
+        if self.tracing:
+            tracemalloc.start()
+        self.phases = []  # names of the phases in order of their first call
+        self.stack = []  # [nested time] of each open phase
+        self.events = np.zeros(
+            (1024, 6)
+        )  # phase, start, duration, nested time, blocks, and bytes of each call
+        self.count = 0
+        self.origin = time.perf_counter()
+        self.trials = 0  # trials of the specialist over all steps
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """timing a phase of the step"""
+        if name not in self.phases:
+            self.phases.append(name)
+        blocks, traced = self.allocations()
+        self.stack.append([0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            (nested,) = self.stack.pop()
+            if self.stack:
+                self.stack[-1][0] += duration
+            allocatedBlocks, tracedBytes = self.allocations()
+            self.add(
+                self.phases.index(name),
+                start - self.origin,
+                duration,
+                nested,
+                allocatedBlocks - blocks,
+                tracedBytes - traced,
+            )
+
+    def allocations(self) -> tuple[int, int]:
+        """returning the allocated Python memory blocks and the memory traced by tracemalloc"""
+        if not self.memory:
+            return 0, 0
+        return sys.getallocatedblocks(), tracemalloc.get_traced_memory()[0]
+
+    def add(self, *event: float) -> None:
+        """adding the event of a finished call"""
+        if self.count == len(self.events):
+            self.events = np.concatenate([self.events, np.zeros_like(self.events)])
+        self.events[self.count] = event
+        self.count += 1
+
+    def close(self) -> None:
+        """stopping the memory tracing started by this profiler"""
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def summary(self) -> pd.DataFrame:
+        """returning calls, total, own, and mean time as well as allocations per phase"""
+        events = self.events[: self.count]
+        rows = []
+        for index, name in enumerate(self.phases):
+            calls = events[:, 0] == index
+            total = events[calls, 2].sum()
+            rows.append(
+                {
+                    "phase": name,
+                    "calls": int(calls.sum()),
+                    "totalTime": total,
+                    "ownTime": total - events[calls, 3].sum(),
+                    "meanTime": total / max(calls.sum(), 1),
+                    "allocatedBlocks": int(events[calls, 4].sum())
+                    if self.memory
+                    else np.nan,
+                    "tracedBytes": int(events[calls, 5].sum())
+                    if self.memory
+                    else np.nan,
+                    "specialistTrials": self.trials
+                    if name == "specialistPriceCalc"
+                    else np.nan,
+                }
+            )
+        frame = pd.DataFrame(rows).set_index("phase")
+        frame["share"] = frame["ownTime"] / frame["ownTime"].sum()
+        return frame
+
+    def trace(self) -> dict:
+        """returning all calls in the trace event format of chrome://tracing and Perfetto"""
+        return {
+            "traceEvents": [
+                {
+                    "name": self.phases[int(phase)],
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": 0,
+                    "args": {
+                        "allocatedBlocks": int(blocks),
+                        "tracedBytes": int(traced),
+                    },
+                }
+                for phase, start, duration, _, blocks, traced in self.events[
+                    : self.count
+                ]
+            ],
+            "otherData": {"specialistTrials": self.trials},
+        }
+
+    def export(self, path: str) -> None:
+        """writing the trace to a JSON file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(self.trace(), file)
+
+
+class NoProfiler:
+    """profiler doing nothing, used while profiling is disabled"""
+
+    def __init__(self):
+        self.context = contextlib.nullcontext()
+        self.trials = 0
+
+    def phase(self, name: str):
+        return self.context
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+
+
+class Column:
+    """preallocated column of a recorded variable following its recording policy
+
+    Policies are "step" (every step), an integer k (every k-th step and the last
+    step), "aggregate" (running count, sum, minimum, maximum, and last value only),
+    and "off". Agent variables hold one value per agent and recorded step. With
+    sparse recording as (burnIn, every), steps after the burn-in are recorded only
+    every `every`-th step, or every k-th step if k is larger.
+    """
+
+    def __init__(
+        self,
+        policy,
+        dtype: str,
+        steps: int,
+        width: int | None = None,
+        chunk: int | None = None,
+        sink=None,
+        sparse: tuple | None = None,
+    ):
+        self.policy = policy
+        self.steps = steps
+        self.sink = sink  # receiving the values and time steps of full chunks
+        shape = () if width is None else (width,)
+        if policy == "aggregate":
+            self.count = np.zeros(shape, dtype=np.int64)
+            self.total = np.zeros(shape)
+            self.minimum = np.full(shape, np.inf)
+            self.maximum = np.full(shape, -np.inf)
+            self.last = np.full(shape, np.nan)
+        elif policy != "off":
+            self.every = 1 if policy == "step" else int(policy)
+            self.burnIn = steps if sparse is None else min(int(sparse[0]), steps)
+            self.stride = (
+                self.every if sparse is None else max(self.every, int(sparse[1]))
+            )
+            rows = (
+                self.burnIn // self.every
+                + 1
+                + (steps - self.burnIn) // self.stride
+                + (self.previousRow(steps) is not None)
+            )
+            self.lastRow = rows - 1
+            self.chunk = rows if chunk is None else min(chunk, rows)
+            self.offset = 0  # first row of the current chunk
+            self.shape, self.dtype = (self.chunk,) + shape, dtype
+            self.values = np.full(self.shape, np.nan, dtype=dtype)
+            self.times = np.full(self.chunk, -1)  # recorded time step per row
+
+    def previousRow(self, t: int) -> int | None:
+        """returning the row of the last regularly recorded step before t or None if t is recorded regularly"""
+        if t <= self.burnIn:
+            return None if t % self.every == 0 else t // self.every
+        if (t - self.burnIn) % self.stride == 0:
+            return None
+        return self.burnIn // self.every + (t - self.burnIn) // self.stride
+
+    def row(self, t: int) -> int | None:
+        """returning the row of a time step or None if it is not recorded"""
+        if t <= self.burnIn:
+            if t % self.every == 0:
+                return t // self.every
+        elif (t - self.burnIn) % self.stride == 0:
+            return self.burnIn // self.every + (t - self.burnIn) // self.stride
+        if t == self.steps:
+            return self.lastRow
+        return None
+
+    def stop(self, t: int) -> None:
+        """ending the column at an earlier last step, which is recorded as well"""
+        if self.policy not in ["off", "aggregate"] and self.previousRow(t) is not None:
+            self.lastRow = self.previousRow(t) + 1
+        self.steps = t
+
+    def set(self, t: int, value, index=...) -> None:
+        """recording the value of a time step for all agents or the agent at index"""
+        if self.policy == "off":
+            return
+        if self.policy == "aggregate":
+            self.count[index] += 1
+            self.total[index] += value
+            self.minimum[index] = np.minimum(self.minimum[index], value)
+            self.maximum[index] = np.maximum(self.maximum[index], value)
+            self.last[index] = value
+            return
+        row = self.row(t)
+        if row is None:
+            return
+        if row >= self.offset + self.chunk:
+            # handing the full chunk to the sink and starting the chunk of this row
+            self.flush()
+            self.offset = row - row % self.chunk
+        self.values[row - self.offset, index] = value
+        self.times[row - self.offset] = t
+
+    def flush(self) -> None:
+        """handing the recorded rows of the current chunk to the sink and clearing it"""
+        if self.sink is None or self.policy in ["off", "aggregate"]:
+            return
+        times, values = self.series()
+        if len(times):
+            self.sink(times, values)
+        self.values = np.full(self.shape, np.nan, dtype=self.dtype)
+        self.times = np.full(self.chunk, -1)
+
+    def series(self) -> tuple[np.ndarray, np.ndarray]:
+        """returning the recorded time steps and values"""
+        recorded = self.times >= 0
+        return self.times[recorded], self.values[recorded]
+
+    def aggregates(self) -> dict:
+        """returning mean, minimum, maximum, and (average) last value of an aggregated column"""
+        return {
+            "Mean": self.total.sum() / max(self.count.sum(), 1),
+            "Min": self.minimum.min(),
+            "Max": self.maximum.max(),
+            "Last": np.mean(self.last),
+        }
+
+
+def modelFrame(series: dict) -> pd.DataFrame:
+    """returning a frame of model variables indexed by time step from (times, values) per variable"""
+    frame = pd.DataFrame(
+        {key: pd.Series(values, index=times) for key, (times, values) in series.items()}
+    )
+    frame.index.name = "t"
+    return frame
+
+
+def agentFrame(series: dict, objIds: np.ndarray) -> pd.DataFrame:
+    """returning a frame of agent variables indexed by agent id and time step from (times, values) per variable"""
+    frame = {}
+    for key, (times, values) in series.items():
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(objIds, len(times)), np.tile(times, len(objIds))],
+            names=["obj_id", "t"],
+        )
+        frame[key] = pd.Series(values.T.ravel(), index=index)
+    if not frame:
+        # no agent variables recorded, e.g. with all of them turned off for large populations
+        return pd.DataFrame(
+            index=pd.MultiIndex.from_arrays([[], []], names=["obj_id", "t"])
+        )
+    return pd.DataFrame(frame)
+
+
+def addIndexColumns(frame: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """prepending additional index columns like sample_id and iteration of experiments"""
+    index = list(frame.index.names)
+    frame = frame.reset_index()
+    for key, value in columns.items():
+        frame[key] = value
+    return frame.set_index(list(columns) + index)
+
+
+class Recorder:
+    """columnar recorder of model and agent variables backed by preallocated NumPy arrays
+
+    Policies are given as (variable, policy) or (variable, policy, dtype) entries,
+    e.g. (("utility", "off"), ("cash", 10, "float32")), which stay hashable as
+    agentpy parameters. Variables without policy are recorded every step as float64.
+    With a writer, the columns only hold one chunk of rows, which is handed to the
+    writer once it is full. Sparse recording as (burnIn, every) thins out all
+    recorded variables after the burn-in.
+    """
+
+    def __init__(
+        self, steps: int, policies: tuple = (), writer=None, sparse: tuple | None = None
+    ):
+        self.steps = steps
+        self.policies = {
+            key: (policy, dtype[0] if dtype else "float64")
+            for key, policy, *dtype in policies
+        }
+        self.writer = writer
+        self.sparse = sparse
+        self.modelColumns = {}
+        self.agentColumns = {}
+        self.rows = {}  # row of each agent id in the agent columns
+
+    def register(self, objIds: list) -> None:
+        """registering agent ids in the order of their rows"""
+        for objId in objIds:
+            self.rows.setdefault(objId, len(self.rows))
+        if self.writer is not None:
+            self.writer.writeArray("agents", "obj_id", np.array(list(self.rows)))
+
+    def column(self, table: str, key: str, width: int | None = None) -> Column:
+        """returning the column of a variable of the model or agents table and creating it on first use"""
+        columns = self.modelColumns if table == "model" else self.agentColumns
+        if key not in columns:
+            policy, dtype = self.policies.get(key, ("step", "float64"))
+            columns[key] = Column(
+                policy,
+                dtype,
+                steps=self.steps,
+                width=width,
+                chunk=None if self.writer is None else self.writer.chunk,
+                sink=None if self.writer is None else self.writer.sink(table, key),
+                sparse=self.sparse,
+            )
+        return columns[key]
+
+    def stop(self, t: int) -> None:
+        """ending all columns at an earlier last step, e.g. of a run stopped early"""
+        self.steps = t
+        for column in list(self.modelColumns.values()) + list(
+            self.agentColumns.values()
+        ):
+            column.stop(t)
+
+    def record(self, t: int, key: str, value) -> None:
+        """recording a model variable"""
+        self.column("model", key).set(t, value)
+
+    def recordAgent(self, t: int, objId: int, key: str, value) -> None:
+        """recording a variable of a single agent"""
+        self.column("agents", key, width=len(self.rows)).set(
+            t, value, index=self.rows[objId]
+        )
+
+    def recordAgents(self, t: int, key: str, values: np.ndarray) -> None:
+        """recording a variable of all agents at once"""
+        self.column("agents", key, width=len(self.rows)).set(t, values)
+
+    def recording(self, key: str) -> bool:
+        """returning whether a variable is recorded at all, e.g. the final rules of the agents"""
+        return self.policies.get(key, ("step",))[0] != "off"
+
+    def aggregates(self) -> dict:
+        """returning the aggregates of all aggregated model and agent variables"""
+        return {
+            key + statistic: value
+            for columns in [self.modelColumns, self.agentColumns]
+            for key, column in columns.items()
+            if column.policy == "aggregate"
+            for statistic, value in column.aggregates().items()
+        }
+
+    def recorded(self, columns: dict) -> list:
+        """returning the keys of the columns with recorded rows"""
+        return [
+            key
+            for key, column in columns.items()
+            if column.policy not in ["off", "aggregate"]
+        ]
+
+    def close(self, **objects) -> None:
+        """flushing the last chunks and closing the writer with the given objects, like the rules"""
+        if self.writer is None:
+            return
+        for column in list(self.modelColumns.values()) + list(
+            self.agentColumns.values()
+        ):
+            column.flush()
+        self.writer.close(
+            keys={
+                "model": self.recorded(self.modelColumns),
+                "agents": self.recorded(self.agentColumns),
+            },
+            **objects,
+        )
+
+    def modelFrame(self) -> pd.DataFrame:
+        """returning the recorded model variables indexed by time step"""
+        if self.writer is not None:
+            return modelFrame(self.writer.series("model"))
+        return modelFrame(
+            {
+                key: self.modelColumns[key].series()
+                for key in self.recorded(self.modelColumns)
+            }
+        )
+
+    def agentFrame(self) -> pd.DataFrame:
+        """returning the recorded agent variables indexed by agent id and time step"""
+        if self.writer is not None:
+            return agentFrame(
+                self.writer.series("agents"), self.writer.readArray("agents", "obj_id")
+            )
+        return agentFrame(
+            {
+                key: self.agentColumns[key].series()
+                for key in self.recorded(self.agentColumns)
+            },
+            np.array(list(self.rows)),
+        )
@@ -0,0 +1,368 @@
+import numpy as np
+
+MATCHBITS = (1 << 11) - 1  # condition bits 1 to 11 are matched against the world state
+FUNDAMENTALBITS = 0b111111  # condition bits 1 to 6 reflect fundamental conditions
+TECHNICALBITS = 0b1111 << 6  # condition bits 7 to 10 reflect technical conditions
+CONSTANTCARE = 0b11 << 10  # condition bits 11 and 12 are always specified
+CONSTANTVALUE = 1 << 10  # condition bit 11 is always set, condition bit 12 never
+BITCOUNT = np.array(
+    [bin(i).count("1") for i in range(1 << 12)], dtype=np.int64
+)  # number of specified bits for every possible 12 bit mask
+
+SPECIFICITY = np.array(
+    [TECHNICALBITS, FUNDAMENTALBITS, (1 << 12) - 1]
+)  # masks of the technical, fundamental, and all specified bits counted per rule table
+
+FIELDS = {
+    "activationIndicator": np.int64,
+    "activationCount": np.int64,
+    "a": np.float64,
+    "b": np.float64,
+    "fitness": np.float64,
+    "accuracy": np.float64,
+    "errorVariance": np.float64,
+    "prevForecast": np.float64,
+}  # numeric rule fields stored as one contiguous array each
+
+COMPACTFIELDS = FIELDS | {
+    "activationIndicator": np.int8,
+    "activationCount": np.int32,
+    "a": np.float32,
+    "b": np.float32,
+    "accuracy": np.float32,
+    "errorVariance": np.float32,
+    "prevForecast": np.float32,
+}  # narrow rule fields of the compact storage, keeping the fitness of about 1e9 in double precision
+CACHEROWS = 32  # most world states kept per match cache, about 95% of the lookups hit
+CACHEBYTES = 64 * 2**20  # most memory of the matches kept per match cache
+COMPACTCONDITION = (
+    np.int16
+)  # condition masks of the compact storage, holding all 12 bits
+
+
+def specificityCounts(care: np.ndarray) -> np.ndarray:
+    """returning the technical, fundamental, and all specified bits summed over the care masks"""
+    return BITCOUNT[np.asarray(care)[:, None] & SPECIFICITY].sum(axis=0)
+
+
+def encodeCondition(condition: dict) -> tuple[int, int]:
+    """encoding a condition dict as care mask (bit not None) and value mask (bit set)"""
+    care, value = 0, 0
+    for bitID, bit in condition.items():
+        if bit is not None:
+            care |= 1 << (bitID - 1)
+            if bit:
+                value |= 1 << (bitID - 1)
+    return care, value
+
+
+def decodeCondition(care: int, value: int) -> dict:
+    """decoding care and value masks into a condition dict with keys 1 to 12"""
+    return {
+        bitID: ((value >> (bitID - 1)) & 1 if (care >> (bitID - 1)) & 1 else None)
+        for bitID in range(1, 13)
+    }
+
+
+class MatchCache:
+    """memo of the live rules matching the recently seen encoded world states
+
+    The matches are stored per world state for all slots of the condition arrays of
+    one agent, or of all agents stacked as (N, M + 1) arrays. At most CACHEROWS world
+    states, and no more than CACHEBYTES of matches, are kept, and the least recently
+    used one is replaced by a new world state. Slots whose conditions changed, e.g.
+    in the genetic algorithm, are patched for all cached world states on the next
+    lookup. The default slot is evaluated on every lookup, as it is established
+    outside the genetic algorithm.
+    """
+
+    def __init__(self, care: np.ndarray, value: np.ndarray, live: np.ndarray):
+        self.care, self.value, self.live = care, value, live
+        self.capacity = max(1, min(CACHEROWS, CACHEBYTES // max(care.size, 1)))
+        self.rows = (
+            {}
+        )  # row of each cached world state, from least to most recently used
+        self.masks = np.zeros(
+            min(16, self.capacity), dtype=np.int64
+        )  # world state of each row
+        self.matches = np.zeros((len(self.masks),) + care.shape, dtype=bool)
+        self.changes = set()  # indices of slots with changed conditions
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, worldMask, index=...) -> np.ndarray:
+        """returning whether the live rules at index match the encoded world state"""
+        return self.live[index] & (
+            ((self.value[index] ^ worldMask) & self.care[index] & MATCHBITS) == 0
+        )
+
+    def changed(self, index: tuple) -> None:
+        """marking the condition of a slot as changed"""
+        self.changes.add(index)
+
+    def clear(self) -> None:
+        """dropping all cached world states"""
+        self.rows = {}
+        self.changes = set()
+
+    def lookup(self, worldMask: int) -> np.ndarray:
+        """returning the matching live rules of a world state as read-only view"""
+        if self.changes:
+            self.patch()
+        row = self.rows.get(worldMask)
+        if row is None:
+            self.misses += 1
+            row = self.add(worldMask)
+        else:
+            self.hits += 1
+            self.rows[worldMask] = self.rows.pop(worldMask)  # most recently used
+            self.matches[row][..., -1] = self.match(worldMask, (..., -1))
+        return self.matches[row]
+
+    def add(self, worldMask: int) -> int:
+        """matching all rules against a new world state and returning its row"""
+        if len(self.rows) == self.capacity:
+            # replacing the least recently used world state
+            row = self.rows.pop(next(iter(self.rows)))
+        else:
+            row = len(self.rows)
+        if row == len(self.masks):
+            grow = min(len(self.masks), self.capacity - len(self.masks))
+            self.masks = np.concatenate([self.masks, np.zeros(grow, dtype=np.int64)])
+            self.matches = np.concatenate(
+                [self.matches, np.zeros((grow,) + self.care.shape, dtype=bool)]
+            )
+        self.rows[worldMask] = row
+        self.masks[row] = worldMask
+        self.matches[row] = self.match(worldMask)
+        return row
+
+    def patch(self) -> None:
+        """matching the changed slots against all cached world states"""
+        index = tuple(np.array(sorted(self.changes)).T)
+        self.changes = set()
+        rows = len(self.rows)
+        self.matches[(slice(0, rows),) + index] = self.match(
+            self.masks[:rows, None], index
+        )
+
+
+class RuleTable:
+    """struct-of-arrays store of an agent's predictors with a dict-like view API
+
+    Rule i (1 to M) is stored in slot i - 1 and the default rule 0 in slot M, so the
+    slot order equals the iteration order of the former dict of rules. The default
+    slot is only part of the table while `live` is set for it, otherwise it may hold
+    the default predictor kept outside the table. The specified bits of
+    all live rules are counted in `counts` and kept up to date on every change of a
+    condition, so documenting them never scans the rules.
+    """
+
+    def __init__(
+        self,
+        numRules: int,
+        fields: dict | None = None,
+        counts: np.ndarray | None = None,
+    ):
+        self.numRules = numRules
+        self.ruleIDs = np.append(np.arange(1, numRules + 1), 0)  # ruleID per slot
+        if fields is None:
+            fields = {
+                key: np.zeros(numRules + 1, dtype=dtype)
+                for key, dtype in FIELDS.items()
+            }
+            fields["care"] = np.zeros(numRules + 1, dtype=np.int64)
+            fields["value"] = np.zeros(numRules + 1, dtype=np.int64)
+            fields["live"] = np.append(np.ones(numRules, dtype=bool), False)
+        for key, array in fields.items():
+            setattr(self, key, array)
+        self.cache = None  # cache of matching rules, created on first cached lookup
+        self.cacheIndex = ()  # index of the table in a cache shared by a population
+        self.counts = (
+            np.zeros(3, dtype=np.int64) if counts is None else counts
+        )  # technical, fundamental, and all specified bits of the live rules
+        self.recount()
+
+    @classmethod
+    def fromDict(cls, d: dict, numRules: int):
+        """creating a rule table from a dict of rule dicts"""
+        table = cls(numRules=numRules)
+        for ruleID, rule in d.items():
+            table[ruleID] = rule
+        return table
+
+    def toDict(self) -> dict:
+        """returning the rules as dict of rule dicts with plain python values"""
+        return {
+            int(self.ruleIDs[slot]): {
+                "condition": decodeCondition(
+                    int(self.care[slot]), int(self.value[slot])
+                ),
+                **{key: getattr(self, key)[slot].item() for key in FIELDS},
+            }
+            for slot in np.flatnonzero(self.live)
+        }
+
+    def slot(self, ruleID):
+        """returning the slot of a ruleID or an array of ruleIDs"""
+        return (ruleID - 1) % (self.numRules + 1)
+
+    def setCondition(self, slot, care, value) -> None:
+        """setting the condition masks of a slot or an array of slots"""
+        liveSlots = np.atleast_1d(slot)
+        liveSlots = liveSlots[self.live[liveSlots]]
+        previous = self.care[liveSlots]
+        self.care[slot] = care
+        self.value[slot] = value
+        self.counts += specificityCounts(self.care[liveSlots]) - specificityCounts(
+            previous
+        )
+        if self.cache is not None:
+            for changedSlot in np.atleast_1d(slot).tolist():
+                self.cache.changed(self.cacheIndex + (changedSlot,))
+
+    def matching(self, worldMask: int) -> np.ndarray:
+        """returning a boolean array of the live rules matching the encoded world state"""
+        return self.live & (((self.value ^ worldMask) & self.care & MATCHBITS) == 0)
+
+    def cachedMatching(self, worldMask: int) -> np.ndarray:
+        """returning the live rules matching the encoded world state as read-only view from the cache"""
+        if self.cache is None:
+            self.cache = MatchCache(self.care, self.value, self.live)
+        return self.cache.lookup(worldMask)[self.cacheIndex]
+
+    def recount(self) -> None:
+        """counting the specified bits of all live rules after the arrays were overwritten as a whole"""
+        self.counts[:] = specificityCounts(self.care[self.live])
+
+    def clearCache(self) -> None:
+        """dropping the cached matches after the conditions were overwritten as a whole"""
+        if self.cache is not None:
+            self.cache.clear()
+
+    def fitnessAverages(self) -> dict:
+        """returning the fitness weighted averages of the predictors and measures of all live rules"""
+        live = self.live.copy()
+        weights = self.fitness[live]
+        return {
+            key: np.average(getattr(self, key)[live], weights=weights)
+            for key in ["a", "b", "fitness", "accuracy", "errorVariance"]
+        }
+
+    def setDefault(self) -> None:
+        """establishing the default rule as fitness weighted average of all rules"""
+        averages = self.fitnessAverages()
+        slot = self.numRules
+        for key, average in averages.items():
+            getattr(self, key)[slot] = average
+        self.setLive(slot)
+        self.setCondition(slot, CONSTANTCARE, CONSTANTVALUE)
+        self.activationIndicator[slot] = 1
+        self.activationCount[slot] = 0
+
+    def refreshDefault(self) -> None:
+        """storing the fitness weighted average of all rules in the default slot kept outside the table"""
+        slot = self.numRules
+        if self.live[slot]:
+            # dropping a default rule established in the table, e.g. of imported rules
+            self.live[slot] = False
+            self.counts -= specificityCounts(self.care[[slot]])
+        for key, average in self.fitnessAverages().items():
+            getattr(self, key)[slot] = average
+        self.care[slot], self.value[slot] = CONSTANTCARE, CONSTANTVALUE
+        self.activationIndicator[slot] = 1
+        self.activationCount[slot] = 0
+
+    def setLive(self, slot: int) -> None:
+        """making a slot part of the table"""
+        if not self.live[slot]:
+            self.live[slot] = True
+            self.counts += specificityCounts(self.care[[slot]])
+
+    def __getitem__(self, ruleID: int):
+        if ruleID not in self:
+            raise KeyError(ruleID)
+        return RuleView(self, self.slot(ruleID))
+
+    def __setitem__(self, ruleID: int, rule: dict):
+        slot = self.slot(ruleID)
+        self.setLive(slot)
+        view = RuleView(self, slot)
+        for key, value in rule.items():
+            view[key] = value
+
+    def __contains__(self, ruleID) -> bool:
+        return 0 <= ruleID <= self.numRules and bool(self.live[self.slot(ruleID)])
+
+    def __iter__(self):
+        return iter(self.ruleIDs[self.live].tolist())
+
+    def __len__(self) -> int:
+        return int(self.live.sum())
+
+    def get(self, ruleID: int, default=None):
+        return self[ruleID] if ruleID in self else default
+
+    def keys(self) -> list:
+        return list(self)
+
+    def values(self) -> list:
+        return [self[ruleID] for ruleID in self]
+
+    def items(self) -> list:
+        return [(ruleID, self[ruleID]) for ruleID in self]
+
+
+class RuleView:
+    """dict-like view on a single slot of a rule table"""
+
+    def __init__(self, table: RuleTable, slot: int):
+        self.table = table
+        self.slot = slot
+
+    def __getitem__(self, key: str):
+        if key == "condition":
+            return ConditionView(self.table, self.slot)
+        return getattr(self.table, key)[self.slot]
+
+    def __setitem__(self, key: str, value):
+        if key == "condition":
+            self.table.setCondition(self.slot, *encodeCondition(dict(value)))
+        else:
+            getattr(self.table, key)[self.slot] = value
+
+    def get(self, key: str, default=None):
+        return self[key] if key == "condition" or key in FIELDS else default
+
+
+class ConditionView:
+    """dict-like view on the condition bits of a single slot of a rule table"""
+
+    def __init__(self, table: RuleTable, slot: int):
+        self.table = table
+        self.slot = slot
+
+    def __getitem__(self, bitID: int):
+        bit = 1 << (bitID - 1)
+        if not self.table.care[self.slot] & bit:
+            return None
+        return 1 if self.table.value[self.slot] & bit else 0
+
+    def __setitem__(self, bitID: int, value):
+        bit = 1 << (bitID - 1)
+        care, val = int(self.table.care[self.slot]), int(self.table.value[self.slot])
+        care = care | bit if value is not None else care & ~bit
+        val = val | bit if value else val & ~bit
+        self.table.setCondition(self.slot, care, val)
+
+    def get(self, bitID: int, default=None):
+        return self[bitID] if 1 <= bitID <= 12 else default
+
+    def keys(self) -> range:
+        return range(1, 13)
+
+    def values(self) -> list:
+        return [self[bitID] for bitID in self.keys()]
+
+    def items(self) -> list:
+        return [(bitID, self[bitID]) for bitID in self.keys()]
@@ -1,9 +1,12 @@
 from model_params import parameters
 from model import ArtificialStockMarket as ASM
 from agents import MarketStatistician as MS
+from batch import BatchedMarkets
+from ensemble import Ensemble, runEnsemble
 
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 import agentpy as ap
-import glob
+import os
 from datetime import datetime
 import math
 
@@ -21,17 +24,22 @@ def runningExperiment(params: dict = parameters, model: ap.Model = ASM) -> ap.Da
 def runningSplitExperiment(
     params: dict = parameters, model: ap.Model = ASM
 ) -> ap.DataDict:
-    """running an agentpy experiment with extended params in batches"""
+    """running an agentpy experiment with extended params in batches resumed from checkpoints"""
     stepsize = math.ceil(params.get("steps") / params.get("batches"))
     expParams = params
-    expParams.update({"forecastAdaptation": ap.Values(0, 1)})
+    expParams.update(
+        {
+            "forecastAdaptation": ap.Values(0, 1),
+            "checkpointPath": params.get("checkpointPath")
+            or os.path.join("results", "checkpoints"),
+        }
+    )
     batches = math.ceil(params.get("steps") / stepsize)
     for batch in range(batches):
         print(f"Batch {batch+1} of {batches}")
         if batch != 0:
-            # all batches except the first one innate the rules from the previous experiment
-            importPath = getLatestExperimentPath()
-            expParams.update({"importPath": importPath})
+            # all batches except the first one resume from the checkpoints of the previous batch
+            expParams.update({"importPath": expParams.get("checkpointPath")})
         expParams.update(
             {
                 "steps": stepsize,
@@ -57,19 +65,6 @@ def runningSplitExperiment(
             return expResults
 
 
-def getLatestExperimentPath() -> str:
-    """returning the latest experiment path"""
-    list_of_dirs = glob.glob("results/*/")
-    list_of_dirs = [dir for dir in list_of_dirs if "ASM" in dir]
-    list_of_timedeltas = [0] * (len(list_of_dirs))
-    t = datetime.now()
-    for idx, dir in enumerate(list_of_dirs):
-        list_of_timedeltas[idx] = abs(
-            t - datetime.strptime(dir.rsplit("_", 1)[1], "%d%m%Y-%H%M%S/")
-        )
-    return list_of_dirs[list_of_timedeltas.index(min(list_of_timedeltas))]
-
-
 def runningModel(params: dict = parameters, model: ap.Model = ASM) -> ap.DataDict:
     """running the agentpy model with basic params"""
     m = model(params)
@@ -77,6 +72,52 @@ def runningModel(params: dict = parameters, model: ap.Model = ASM) -> ap.DataDic
     return results
 
 
+def runningBatch(
+    params: dict = parameters, seeds: list = range(8), model: ap.Model = ASM
+) -> ap.DataDict:
+    """running independent markets for all seeds as one batch with basic params"""
+    batch = BatchedMarkets(params, seeds, model=model)
+    results = batch.run()
+    return results
+
+
+def runningEnsemble(
+    params: dict = parameters,
+    seeds: list = range(100),
+    workers: int | None = None,
+    chunk: int = 4,
+    model: ap.Model = ASM,
+    **ensemble,
+) -> ap.DataDict:
+    """running an ensemble of seeds on a process pool and returning only its summary per step
+
+    Each worker summarizes `chunk` runs and hands back their partial summary, which
+    is merged right away. At most one chunk per worker is submitted at a time, so the
+    memory does not grow with the number of seeds.
+    """
+    seeds = list(seeds)
+    workers = workers or os.cpu_count()
+    summary = Ensemble(int(params["steps"]), **ensemble)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for start in range(0, len(seeds), chunk):
+            if len(pending) >= workers:
+                # waiting for a free worker and dropping the merged partial summaries
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    summary.merge(future.result())
+            pending.add(
+                pool.submit(
+                    runEnsemble, params, seeds[start : start + chunk], model, **ensemble
+                )
+            )
+        for future in as_completed(pending):
+            summary.merge(future.result())
+    results = summary.summary()
+    results["parameters"] = ap.DataDict(constants=dict(params), seeds=seeds)
+    return results
+
+
 if __name__ == "__main__":
     steps = int(parameters.get("steps"))
     if parameters.get("experimentSplit"):
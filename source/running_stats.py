@@ -0,0 +1,237 @@
+import numpy as np
+import math
+
+
+class RunningVariance:
+    """running mean and population variance of a series based on Welford's algorithm"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the running mean
+
+    def push(self, value: float) -> None:
+        """adding the next value of the series"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else np.nan
+
+
+class RollingMean:
+    """mean of the last window values of a series based on a ring buffer and a running sum
+
+    Each value is written twice, window positions apart, so the last window values
+    are always a contiguous slice in their order in the series. The mean sums this
+    slice in the same order as np.average over the last window values of the whole
+    series, equal to it bit for bit, at a cost linear in the window. Comparisons with
+    the mean take constant time from a compensated running sum, resummed exactly once
+    per window, and only fall back to the mean for values within its rounding error.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buffer = np.zeros(2 * window)
+        self.count = 0  # number of values in the window
+        self.position = 0  # position of the next value in the buffer
+        self.total = 0.0  # running sum of the window with its compensation (Neumaier)
+        self.compensation = 0.0
+        self.magnitude = (
+            0.0  # running sum of the absolute values, scaling the rounding error
+        )
+
+    def push(self, value: float) -> None:
+        """adding the next value of the series and dropping the oldest one outside the window"""
+        value = float(value)
+        if self.count == self.window:
+            dropped = float(self.buffer[self.position])
+            self.add(-dropped)
+            self.magnitude -= abs(dropped)
+        else:
+            self.count += 1
+        self.buffer[self.position] = value
+        self.buffer[self.position + self.window] = value
+        self.add(value)
+        self.magnitude += abs(value)
+        self.position = (self.position + 1) % self.window
+        if self.position == 0:
+            self.resum()  # bounding the rounding error of the running sums
+
+    def add(self, x: float) -> None:
+        """adding a value to the running sum with Neumaier's compensation"""
+        total = self.total + x
+        if abs(self.total) >= abs(x):
+            self.compensation += (self.total - total) + x
+        else:
+            self.compensation += (x - total) + self.total
+        self.total = total
+
+    def windowValues(self) -> np.ndarray:
+        """returning the last window values in their order in the series"""
+        end = self.position + self.window
+        return self.buffer[end - self.count : end]
+
+    def resum(self) -> None:
+        """summing the running sums of the window anew"""
+        values = self.windowValues()
+        self.total, self.compensation = math.fsum(values), 0.0
+        self.magnitude = math.fsum(np.abs(values))
+
+    @property
+    def mean(self) -> float:
+        return self.windowValues().mean() if self.count else np.nan
+
+    def below(self, value: float) -> bool:
+        """returning whether the mean is below the value, like value > mean"""
+        if not self.count:
+            return False
+        difference = value - (self.total + self.compensation) / self.count
+        if abs(difference) > 1e-10 * self.magnitude / self.count:
+            return difference > 0
+        return value > self.mean  # deciding values close to the mean like np.average
+
+
+class RunningMoments:
+    """running mean and central moments up to the fourth of a series pushed in chunks
+
+    The moments of each chunk are merged with the pairwise update of Pébay (2008),
+    so chunks of any size give the moments of the whole series.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sums of the second to fourth powers of deviations from the mean
+        self.m3 = 0.0
+        self.m4 = 0.0
+
+    def push(self, values: np.ndarray) -> None:
+        """adding the next chunk of the series"""
+        values = np.asarray(values, dtype=float)
+        nb = len(values)
+        if not nb:
+            return
+        meanB = values.mean()
+        deviations = values - meanB
+        m2b, m3b, m4b = [np.sum(deviations**power) for power in [2, 3, 4]]
+        na, n = self.count, self.count + nb
+        delta = meanB - self.mean
+        self.m4 += (
+            m4b
+            + delta**4 * na * nb * (na * na - na * nb + nb * nb) / n**3
+            + 6 * delta**2 * (na * na * m2b + nb * nb * self.m2) / n**2
+            + 4 * delta * (na * m3b - nb * self.m3) / n
+        )
+        self.m3 += (
+            m3b
+            + delta**3 * na * nb * (na - nb) / n**2
+            + 3 * delta * (na * m2b - nb * self.m2) / n
+        )
+        self.m2 += m2b + delta**2 * na * nb / n
+        self.mean += delta * nb / n
+        self.count = n
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else np.nan
+
+    @property
+    def skewness(self) -> float:
+        return (
+            math.sqrt(self.count) * self.m3 / self.m2**1.5 if self.m2 > 0 else np.nan
+        )
+
+    @property
+    def kurtosis(self) -> float:
+        """excess kurtosis, zero for normally distributed values"""
+        return self.count * self.m4 / self.m2**2 - 3 if self.m2 > 0 else np.nan
+
+
+class RunningCovariance:
+    """running means, variances, and covariance of two aligned series pushed in chunks"""
+
+    def __init__(self):
+        self.x = RunningMoments()
+        self.y = RunningMoments()
+        self.c = 0.0  # sum of the products of the deviations from the means
+
+    def push(self, x: np.ndarray, y: np.ndarray) -> None:
+        """adding the next chunk of both series"""
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        nb = len(x)
+        if not nb:
+            return
+        na, n = self.x.count, self.x.count + nb
+        cb = np.sum((x - x.mean()) * (y - y.mean()))
+        self.c += cb + (x.mean() - self.x.mean) * (y.mean() - self.y.mean) * na * nb / n
+        self.x.push(x)
+        self.y.push(y)
+
+    @property
+    def correlation(self) -> float:
+        if self.x.m2 <= 0 or self.y.m2 <= 0:
+            return np.nan
+        return self.c / math.sqrt(self.x.m2 * self.y.m2)
+
+
+class RunningAutocorrelation:
+    """running autocorrelation function up to a maximum lag of a series pushed in chunks
+
+    The lagged products are summed across chunk borders with the last maxLag values
+    of the previous chunk, and the first and last maxLag values give the sums needed
+    to center the products on the mean of the whole series.
+    """
+
+    def __init__(self, maxLag: int):
+        self.maxLag = maxLag
+        self.count = 0
+        self.total = 0.0
+        self.products = np.zeros(maxLag + 1)  # sums of x_t * x_{t - k} for each lag k
+        self.head = np.zeros(0)  # first maxLag values
+        self.tail = np.zeros(0)  # last maxLag values
+
+    def push(self, values: np.ndarray) -> None:
+        """adding the next chunk of the series"""
+        values = np.asarray(values, dtype=float)
+        extended = np.concatenate([self.tail, values])
+        offset = len(self.tail)
+        for lag in range(self.maxLag + 1):
+            start = max(offset, lag)
+            if start < len(extended):
+                self.products[lag] += (
+                    extended[start:] @ extended[start - lag : len(extended) - lag]
+                )
+        self.count += len(values)
+        self.total += values.sum()
+        if len(self.head) < self.maxLag:
+            self.head = np.concatenate(
+                [self.head, values[: self.maxLag - len(self.head)]]
+            )
+        self.tail = (
+            extended[max(len(extended) - self.maxLag, 0) :]
+            if self.maxLag
+            else extended[:0]
+        )
+
+    def acf(self) -> np.ndarray:
+        """returning the autocorrelations for the lags 0 to maxLag"""
+        n = self.count
+        if not n:
+            return np.full(self.maxLag + 1, np.nan)
+        mean = self.total / n
+        autocovariance = np.full(self.maxLag + 1, np.nan)
+        for lag in range(min(self.maxLag, n - 1) + 1):
+            first = self.total - (
+                self.tail[len(self.tail) - lag :].sum() if lag else 0.0
+            )
+            last = self.total - self.head[:lag].sum()
+            autocovariance[lag] = (
+                self.products[lag] - mean * (first + last) + (n - lag) * mean**2
+            ) / n
+        if not autocovariance[0] > 0:
+            return np.full(self.maxLag + 1, np.nan)
+        return autocovariance / autocovariance[0]
@@ -0,0 +1,405 @@
+from rules import RuleTable
+from checkpoint import RULEFIELDS
+from recorder import modelFrame, agentFrame, addIndexColumns
+
+from ast import literal_eval
+import agentpy as ap
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import shutil
+
+TYPES = {
+    "model": "ArtificialStockMarket",
+    "agents": "MarketStatistician",
+}  # object types of the tables in the output
+
+
+def encode(values: np.ndarray, encoding: str | None) -> np.ndarray:
+    """encoding the rows of a chunk, delta encoding is lossless for floats as xor of the bit patterns"""
+    if encoding != "delta" or not len(values):
+        return values
+    if values.dtype.kind == "f":
+        bits = values.view(f"u{values.dtype.itemsize}")
+        return np.concatenate([bits[:1], bits[1:] ^ bits[:-1]])
+    return np.concatenate([values[:1], np.diff(values, axis=0)])
+
+
+def decode(values: np.ndarray, encoding: str | None, dtype: str) -> np.ndarray:
+    """decoding the rows of a chunk"""
+    dtype = np.dtype(dtype)
+    if encoding != "delta":
+        return values
+    if dtype.kind == "f":
+        return np.bitwise_xor.accumulate(values, axis=0).view(dtype)
+    return np.cumsum(values, axis=0, dtype=dtype)
+
+
+def writeColumn(
+    path: str,
+    times: np.ndarray,
+    values: np.ndarray,
+    dtype: str,
+    encoding: str | None,
+    compressed: bool,
+    chunk: int,
+) -> dict:
+    """writing a column in chunks of rows and returning its description"""
+    os.makedirs(path, exist_ok=True)
+    values = values.astype(dtype)
+    chunks = []
+    for index, begin in enumerate(range(0, len(times), chunk)):
+        rows = slice(begin, begin + chunk)
+        chunkPath = os.path.join(path, f"{index:06d}")
+        if compressed:
+            np.savez_compressed(
+                chunkPath + ".npz", t=times[rows], values=encode(values[rows], encoding)
+            )
+        else:
+            np.save(chunkPath + ".t.npy", times[rows])
+            np.save(chunkPath + ".values.npy", encode(values[rows], encoding))
+        chunks.append([int(times[rows][0]), int(times[rows][-1])])
+    return {
+        "dtype": dtype,
+        "encoding": encoding,
+        "compressed": compressed,
+        "chunks": chunks,
+    }
+
+
+def readColumn(
+    path: str, column: dict, start: int | None = None, stop: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """reading the time steps and values of a column between start and stop (inclusive)
+
+    Only the chunks overlapping the time steps are read, and uncompressed chunks
+    without encoding are memory-mapped.
+    """
+    start = -np.inf if start is None else start
+    stop = np.inf if stop is None else stop
+    times, values = [], []
+    for index, (first, last) in enumerate(column["chunks"]):
+        if last < start or first > stop:
+            continue
+        chunkPath = os.path.join(path, f"{index:06d}")
+        if column["compressed"]:
+            with np.load(chunkPath + ".npz") as chunk:
+                chunkTimes, chunkValues = chunk["t"], chunk["values"]
+        else:
+            chunkTimes = np.load(chunkPath + ".t.npy")
+            chunkValues = np.load(chunkPath + ".values.npy", mmap_mode="r")
+        rows = (chunkTimes >= start) & (chunkTimes <= stop)
+        times.append(chunkTimes[rows])
+        values.append(decode(chunkValues, column["encoding"], column["dtype"])[rows])
+    if not times:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=column["dtype"])
+    return np.concatenate(times), np.concatenate(values)
+
+
+def ruleArray(rules: list, numRules: int) -> np.ndarray:
+    """returning the rule tables of all agents as structured array of shape (agents, numRules + 1)"""
+    tables = [RuleTable.fromDict(d, numRules=numRules) for d in rules]
+    array = np.zeros(
+        (len(tables), numRules + 1),
+        dtype=[(key, getattr(tables[0], key).dtype) for key in RULEFIELDS]
+        if tables
+        else [],
+    )
+    for row, table in enumerate(tables):
+        for key in RULEFIELDS:
+            array[key][row] = getattr(table, key)
+    return array
+
+
+def saveStore(
+    results: ap.DataDict,
+    path: str,
+    dtype: str = "float64",
+    dtypes: dict | None = None,
+    encoding: str | None = None,
+    compressed: bool = True,
+    chunk: int = 4096,
+) -> None:
+    """saving agentpy results in the compact store format
+
+    Every variable of every run is stored as chunked column, with float variables
+    converted to dtype (or their entry in dtypes, e.g. {"cash": "float32"}), agent
+    variables as one column of shape (steps, agents). Delta encoding pays off for
+    slowly changing variables like positions, but hardly for prices. The rules at the end of each
+    run are stored as structured array with one row per agent and one column per slot.
+    """
+    dtypes = dtypes or {}
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    model = results["variables"][TYPES["model"]]
+    agents = results["variables"].get(TYPES["agents"])
+    runIndex = [name for name in model.index.names if name != "t"]
+    constants = dict(results.get("parameters", {}).get("constants", {}))
+    meta = {"version": 1, "types": TYPES, "runs": {}, "parameters": constants}
+    # grouping by a single level without a list, as pandas returns tuples for lists of one level in future
+    groups = (
+        model.groupby(runIndex if len(runIndex) > 1 else runIndex[0], observed=True)
+        if runIndex
+        else [((), model)]
+    )
+    for run, modelRun in groups:
+        run = run if isinstance(run, tuple) else (run,)
+        columns = dict(
+            zip(
+                runIndex,
+                [value.item() if hasattr(value, "item") else value for value in run],
+            )
+        )
+        name = "_".join(["run"] + [str(value) for value in columns.values()])
+        runPath = os.path.join(path, name)
+        runMeta = {"columns": columns, "model": {}, "agents": {}}
+
+        def column(table: str, key: str, series: pd.Series | pd.DataFrame):
+            values = series.to_numpy()
+            kind = values.dtype.kind
+            runMeta[table][key] = writeColumn(
+                os.path.join(runPath, table, key),
+                series.index.to_numpy(dtype=np.int64),
+                values,
+                dtypes.get(key, dtype if kind == "f" else values.dtype.str),
+                encoding,
+                compressed,
+                chunk,
+            )
+
+        modelRun = modelRun.droplevel(runIndex) if runIndex else modelRun
+        for key in modelRun:
+            column("model", key, modelRun[key].dropna())
+        if agents is not None:
+            agentRun = agents.loc[run] if runIndex else agents
+            variables = [key for key in agentRun if key != "rules"]
+            objIds = agentRun.index.get_level_values("obj_id").unique().sort_values()
+            runMeta["obj_id"] = objIds.tolist()
+            for key in variables:
+                column(
+                    "agents",
+                    key,
+                    agentRun[key].unstack("obj_id")[objIds].dropna(how="all"),
+                )
+            if "rules" in agentRun:
+                rules = agentRun["rules"].dropna()
+                rules = rules[
+                    ~rules.index.get_level_values("obj_id").duplicated(keep="last")
+                ]
+                rules = rules.droplevel("t").reindex(objIds)
+                parsed = [
+                    rule if isinstance(rule, dict) else literal_eval(rule)
+                    for rule in rules
+                ]
+                numRules = constants.get("M") or max(max(d) for d in parsed)
+                np.save(
+                    os.path.join(runPath, "rules.npy"), ruleArray(parsed, int(numRules))
+                )
+                runMeta["rulesT"] = int(
+                    agentRun["rules"].dropna().index.get_level_values("t").max()
+                )
+        if "reporters" in results:
+            reporters = results["reporters"]
+            row = (
+                reporters.loc[run[0] if len(run) == 1 else run]
+                if runIndex and reporters.index.names == runIndex
+                else reporters.iloc[0]
+            )
+            runMeta["reporters"] = json.loads(row.to_json())
+        meta["runs"][name] = runMeta
+    with open(os.path.join(path, "store.json"), "w") as file:
+        json.dump(meta, file, default=str)
+
+
+def isStore(path: str) -> bool:
+    """returning whether a path is a directory in the store format"""
+    return os.path.isfile(os.path.join(path, "store.json"))
+
+
+class Store:
+    """lazy access to the variables and rules of the runs in a store"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "store.json")) as file:
+            self.meta = json.load(file)
+        self.runs = list(self.meta["runs"])
+
+    def run(self, run: str | None) -> str:
+        """returning the given run or the only run of the store"""
+        if run is None:
+            if len(self.runs) != 1:
+                raise ValueError(
+                    f"{self.path} holds {len(self.runs)} runs, choose one of {self.runs}"
+                )
+            return self.runs[0]
+        return run
+
+    def chunks(self, key: str, run: str | None = None, table: str = "model") -> list:
+        """returning the first and last time step of each chunk of a variable of a run"""
+        return self.meta["runs"][self.run(run)][table][key]["chunks"]
+
+    def variables(self, run: str | None = None, table: str = "model") -> list:
+        """returning the stored variables of a table of a run"""
+        return list(self.meta["runs"][self.run(run)][table])
+
+    def series(
+        self,
+        key: str,
+        run: str | None = None,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> pd.Series:
+        """reading a model variable of a run between the time steps start and stop"""
+        run = self.run(run)
+        times, values = readColumn(
+            os.path.join(self.path, run, "model", key),
+            self.meta["runs"][run]["model"][key],
+            start,
+            stop,
+        )
+        return pd.Series(values, index=pd.Index(times, name="t"), name=key)
+
+    def agentSeries(
+        self,
+        key: str,
+        run: str | None = None,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> pd.DataFrame:
+        """reading an agent variable of a run between the time steps start and stop as steps by agents"""
+        run = self.run(run)
+        times, values = readColumn(
+            os.path.join(self.path, run, "agents", key),
+            self.meta["runs"][run]["agents"][key],
+            start,
+            stop,
+        )
+        return pd.DataFrame(
+            values,
+            index=pd.Index(times, name="t"),
+            columns=pd.Index(self.meta["runs"][run]["obj_id"], name="obj_id"),
+        )
+
+    def rules(self, run: str | None = None) -> np.ndarray:
+        """returning the structured array of the rules of all agents of a run"""
+        return np.load(
+            os.path.join(self.path, self.run(run), "rules.npy"), mmap_mode="r"
+        )
+
+    def ruleTable(self, objId: int, run: str | None = None) -> RuleTable:
+        """returning the rule table of an agent of a run"""
+        run = self.run(run)
+        row = self.meta["runs"][run]["obj_id"].index(objId)
+        rules = self.rules(run)
+        return RuleTable(
+            numRules=rules.shape[1] - 1,
+            fields={key: np.array(rules[key][row]) for key in RULEFIELDS},
+        )
+
+    def load(
+        self,
+        keys: list | None = None,
+        start: int | None = None,
+        stop: int | None = None,
+    ) -> ap.DataDict:
+        """loading the variables of all runs as agentpy DataDict, with the rules as strings"""
+        variables, reporters = {}, []
+        for run, runMeta in self.meta["runs"].items():
+            series = {
+                key: readColumn(
+                    os.path.join(self.path, run, "model", key), column, start, stop
+                )
+                for key, column in runMeta["model"].items()
+                if keys is None or key in keys
+            }
+            frames = {self.meta["types"]["model"]: modelFrame(series)}
+            if "obj_id" in runMeta:
+                series = {
+                    key: readColumn(
+                        os.path.join(self.path, run, "agents", key), column, start, stop
+                    )
+                    for key, column in runMeta["agents"].items()
+                    if keys is None or key in keys
+                }
+                frame = agentFrame(series, np.array(runMeta["obj_id"]))
+                if "rulesT" in runMeta and (keys is None or "rules" in keys):
+                    frame = frame.join(
+                        pd.Series(
+                            [
+                                str(self.ruleTable(objId, run).toDict())
+                                for objId in runMeta["obj_id"]
+                            ],
+                            index=pd.MultiIndex.from_tuples(
+                                [
+                                    (objId, runMeta["rulesT"])
+                                    for objId in runMeta["obj_id"]
+                                ],
+                                names=["obj_id", "t"],
+                            ),
+                            name="rules",
+                        ),
+                        how="outer",
+                    )
+                frames[self.meta["types"]["agents"]] = frame
+            for objType, frame in frames.items():
+                variables.setdefault(objType, []).append(
+                    addIndexColumns(frame, runMeta["columns"])
+                )
+            if "reporters" in runMeta:
+                frame = pd.DataFrame(
+                    {
+                        key: [value]
+                        for key, value in (
+                            runMeta["reporters"] | runMeta["columns"]
+                        ).items()
+                    }
+                )
+                reporters.append(
+                    frame.set_index(list(runMeta["columns"]))
+                    if runMeta["columns"]
+                    else frame
+                )
+        results = ap.DataDict()
+        results["variables"] = ap.DataDict(
+            {objType: pd.concat(frames) for objType, frames in variables.items()}
+        )
+        if reporters:
+            results["reporters"] = pd.concat(reporters)
+        results["parameters"] = ap.DataDict(constants=self.meta["parameters"])
+        return results
+
+
+def loadDataDict(dataDictPath: str) -> ap.DataDict:
+    """loading an agentpy DataDict saved as <path>/<exp_name>_<exp_id>"""
+    exp_name, exp_id = dataDictPath.rsplit("_", 1)
+    path, exp_name = exp_name.rsplit("/", 1)
+    return ap.DataDict.load(exp_name=exp_name, exp_id=exp_id, path=path, display=False)
+
+
+if __name__ == "__main__":
+    # converting a results folder of agentpy to the store format
+    parser = argparse.ArgumentParser(
+        description="converting agentpy results to the store format"
+    )
+    parser.add_argument("dataDictPath")
+    parser.add_argument("storePath")
+    parser.add_argument(
+        "--dtype", default="float64", help="dtype of float variables, e.g. float32"
+    )
+    parser.add_argument("--encoding", default="none", choices=["delta", "none"])
+    parser.add_argument(
+        "--uncompressed", action="store_true", help="memory-mappable chunks"
+    )
+    parser.add_argument("--chunk", type=int, default=4096)
+    args = parser.parse_args()
+    saveStore(
+        loadDataDict(args.dataDictPath),
+        args.storePath,
+        dtype=args.dtype,
+        encoding=None if args.encoding == "none" else args.encoding,
+        compressed=not args.uncompressed,
+        chunk=args.chunk,
+    )
@@ -0,0 +1,131 @@
+import agentpy as ap
+import numpy as np
+
+PURPOSES = [
+    "hree",
+    "dividend",
+    "rules",
+    "geneticAlgorithm",
+    "trigger",
+    "crossover",
+    "mutation",
+]  # purposes of the random streams, their index is part of each stream's key
+
+
+class RandomBlock:
+    """block of pre-drawn random integers in [0, high) handed out one at a time"""
+
+    def __init__(self, generator: np.random.Generator, high: int, size: int = 1024):
+        self.generator = generator
+        self.high = high
+        self.size = size
+        self.position = size  # drawing the first block on first use
+
+    def next(self) -> int:
+        """returning the next integer and drawing a new block if the current one is used up"""
+        if self.position == self.size:
+            self.values = self.generator.integers(self.high, size=self.size).tolist()
+            self.position = 0
+        self.position += 1
+        return self.values[self.position - 1]
+
+
+class LockstepBlocks:
+    """pre-drawn blocks of several keys handed out in lockstep, one integer per key at a time
+
+    The blocks are drawn from the generator of each key like its RandomBlock, so
+    every key gets the same integers as one at a time, while the integers of all
+    keys are handed out as one array. The blocks of the single keys are updated by
+    sync, e.g. before saving a checkpoint.
+    """
+
+    def __init__(self, blocks: list[RandomBlock]):
+        self.blocks = blocks
+        self.size = blocks[0].size
+        self.position = blocks[0].position
+        if any(block.position != self.position for block in blocks):
+            raise ValueError("the blocks are not in lockstep")
+        self.values = (
+            np.array([block.values for block in blocks])
+            if self.position < self.size
+            else None
+        )
+
+    def next(self) -> np.ndarray:
+        """returning the next integer of all keys and drawing new blocks if the current ones are used up"""
+        if self.position == self.size:
+            self.values = np.array(
+                [
+                    block.generator.integers(block.high, size=block.size)
+                    for block in self.blocks
+                ]
+            )
+            self.position = 0
+        self.position += 1
+        return self.values[:, self.position - 1]
+
+    def sync(self) -> None:
+        """writing the current blocks and positions back to the blocks of the single keys"""
+        for block, values in zip(
+            self.blocks, self.values if self.values is not None else []
+        ):
+            block.values = values.tolist()
+        for block in self.blocks:
+            block.position = self.position
+
+
+class RandomStreams:
+    """random streams of a model derived from its seed
+
+    Every purpose and key (e.g. the agent id) gets its own counter-based Philox
+    generator, which is created once and kept for the whole simulation. With legacy
+    set, every call returns a new generator seeded from the model's random module,
+    reproducing the random numbers of former results.
+    """
+
+    def __init__(self, model: ap.Model, legacy: bool = False):
+        self.model = model
+        self.legacy = legacy
+        self.seed = (
+            model.p.seed
+        )  # seed of the stream keys, kept when resuming from a checkpoint
+        self.generators = {}
+        self.blocks = {}
+        self.lockstep = {}  # blocks of several keys per purpose handed out in lockstep
+
+    def generator(self, purpose: str, key: int = 0) -> np.random.Generator:
+        """returning the random generator of a purpose and key"""
+        if self.legacy:
+            return self.model.randomGenerator()
+        if (purpose, key) not in self.generators:
+            self.generators[(purpose, key)] = np.random.Generator(
+                np.random.Philox(key=self.streamKey(purpose, key))
+            )
+        return self.generators[(purpose, key)]
+
+    def block(self, purpose: str, key: int, high: int) -> RandomBlock:
+        """returning the block of pre-drawn integers below high of a purpose and key"""
+        if (purpose, key) not in self.blocks:
+            self.blocks[(purpose, key)] = RandomBlock(
+                self.generator(purpose, key), high=high
+            )
+        return self.blocks[(purpose, key)]
+
+    def streamKey(self, purpose: str, key: int) -> np.ndarray:
+        """returning the 128 bit Philox key of a stream derived from seed, purpose, and key"""
+        return np.random.SeedSequence(
+            [self.seed, PURPOSES.index(purpose), key]
+        ).generate_state(2, dtype=np.uint64)
+
+    def lockstepBlock(self, purpose: str, keys: list, high: int) -> LockstepBlocks:
+        """returning the blocks of pre-drawn integers below high of a purpose for all keys in lockstep"""
+        if purpose not in self.lockstep:
+            self.lockstep[purpose] = LockstepBlocks(
+                [self.block(purpose, key, high=high) for key in keys]
+            )
+        return self.lockstep[purpose]
+
+    def sync(self) -> None:
+        """writing the state of all lockstep blocks back to the blocks of the single keys"""
+        for blocks in self.lockstep.values():
+            blocks.sync()
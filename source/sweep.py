@@ -0,0 +1,235 @@
+from model_params import parameters
+from model import ArtificialStockMarket as ASM
+from writer import loadStream
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import agentpy as ap
+import pandas as pd
+import itertools
+import json
+import glob
+import os
+import socket
+import sys
+import time
+
+
+def sweepJobs(params: dict, grid: dict) -> list[dict]:
+    """returning one job per combination of the grid values, e.g. {"seed": range(10), "N": [25, 50]}"""
+    keys = list(grid)
+    return [
+        {"id": sampleId, "parameters": dict(params, **dict(zip(keys, values)))}
+        for sampleId, values in enumerate(itertools.product(*grid.values()))
+    ]
+
+
+def jobCost(job: dict) -> float:
+    """returning the estimated run time of a job as agent-rule updates over all steps"""
+    p = job["parameters"]
+    return float(p["steps"]) * p["N"] * p["M"]
+
+
+def runJob(path: str, job: dict, model: ap.Model = ASM) -> dict:
+    """running a job with its recorded variables streamed to the runs directory of the sweep"""
+    if not claimJob(path, job["id"]):
+        return {"id": job["id"], "status": "skipped"}  # running on another host
+    if job["id"] in finishedJobs(path):
+        releaseJob(path, job["id"])
+        return {
+            "id": job["id"],
+            "status": "skipped",
+        }  # finished on another host meanwhile
+    start = time.time()
+    p = dict(job["parameters"], streamPath=os.path.join(path, "runs"))
+    run = model(p, _run_id=(job["id"], None))
+    run.run(display=False)
+    return {
+        "id": job["id"],
+        "status": "done",
+        "seconds": time.time() - start,
+        "steps": run.t,
+        "stopReason": run.stopReason,
+    }
+
+
+def readLedger(path: str) -> list[dict]:
+    """returning the entries of the ledgers of all hosts of a sweep"""
+    entries = []
+    for ledgerPath in sorted(glob.glob(os.path.join(path, "ledger*.jsonl"))):
+        with open(ledgerPath) as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    pass  # partial line of a host killed while writing
+    return entries
+
+
+def finishedJobs(path: str) -> set:
+    """returning the ids of all finished jobs of a sweep"""
+    return {entry["id"] for entry in readLedger(path) if entry["status"] == "done"}
+
+
+def claimPath(path: str, jobId: int) -> str:
+    """returning the path of the claim file of a job"""
+    return os.path.join(path, "claims", f"{jobId}.claim")
+
+
+def claimJob(path: str, jobId: int) -> bool:
+    """claiming a job by exclusively creating its claim file, False if it is already claimed"""
+    try:
+        descriptor = os.open(
+            claimPath(path, jobId), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+        )
+    except FileExistsError:
+        return False
+    with os.fdopen(descriptor, "w") as file:
+        json.dump({"host": socket.gethostname(), "pid": os.getpid()}, file)
+    return True
+
+
+def releaseJob(path: str, jobId: int) -> None:
+    """dropping the claim of a job"""
+    try:
+        os.remove(claimPath(path, jobId))
+    except FileNotFoundError:
+        pass
+
+
+def processAlive(pid: int) -> bool:
+    """returning whether a process of this host exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Sweep:
+    """resumable parameter sweep run on a local process pool
+
+    The jobs are written to <path>/jobs.json and every finished or failed job is
+    appended to the JSON-lines ledger of the host, so a restarted sweep skips all
+    finished jobs. The jobs are handed out longest first, and idle workers take the
+    next open job. Each job is claimed by exclusively creating its claim file, so
+    several hosts can work on the same sweep directory on a shared filesystem.
+    """
+
+    def __init__(self, path: str, jobs: list[dict] | None = None):
+        self.path = path
+        self.host = socket.gethostname()
+        os.makedirs(os.path.join(path, "claims"), exist_ok=True)
+        jobsPath = os.path.join(path, "jobs.json")
+        if jobs is None:
+            # joining an existing sweep, e.g. from another host
+            with open(jobsPath) as file:
+                jobs = json.load(file)
+        elif os.path.exists(jobsPath):
+            with open(jobsPath) as file:
+                if json.load(file) != json.loads(json.dumps(jobs)):
+                    raise ValueError(f"{path} holds a sweep with different jobs")
+        else:
+            with open(jobsPath + ".tmp", "w") as file:
+                json.dump(jobs, file)
+            os.replace(jobsPath + ".tmp", jobsPath)
+        self.jobs = {job["id"]: job for job in jobs}
+
+    def note(self, entry: dict) -> None:
+        """appending an entry to the ledger of this host"""
+        entry = dict(entry, host=self.host, time=time.time())
+        ledgerPath = os.path.join(self.path, f"ledger-{self.host}.jsonl")
+        prefix = ""
+        if os.path.exists(ledgerPath) and os.path.getsize(ledgerPath):
+            with open(ledgerPath, "rb") as file:
+                file.seek(-1, os.SEEK_END)
+                prefix = "" if file.read(1) == b"\n" else "\n"  # ending a partial line
+        with open(ledgerPath, "a") as file:
+            file.write(prefix + json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def releaseStale(self) -> None:
+        """dropping the claims of this host left by processes which no longer exist"""
+        for path in glob.glob(os.path.join(self.path, "claims", "*.claim")):
+            try:
+                with open(path) as file:
+                    holder = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if holder["host"] == self.host and not processAlive(holder["pid"]):
+                os.remove(path)
+
+    def openJobs(self) -> list[dict]:
+        """returning the unfinished jobs, longest first"""
+        finished = finishedJobs(self.path)
+        jobs = [job for jobId, job in self.jobs.items() if jobId not in finished]
+        return sorted(jobs, key=jobCost, reverse=True)
+
+    def run(self, workers: int | None = None, model: ap.Model = ASM) -> None:
+        """running all open jobs on a pool of worker processes"""
+        self.releaseStale()
+        jobs = self.openJobs()
+        print(f"{len(self.jobs) - len(jobs)} of {len(self.jobs)} jobs finished")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # the jobs are claimed by the workers once they start them
+            futures = {
+                pool.submit(runJob, self.path, job, model): job["id"] for job in jobs
+            }
+            for future in as_completed(futures):
+                jobId = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as error:
+                    entry = {"id": jobId, "status": "failed", "error": repr(error)}
+                    print(f"Job {jobId} failed: {error!r}")
+                if entry["status"] == "skipped":
+                    continue
+                self.note(entry)
+                # releasing the claim after noting the job, so no other host repeats it
+                releaseJob(self.path, jobId)
+
+    def merge(self) -> ap.DataDict:
+        """merging the results of all finished jobs into one DataDict indexed by sample_id"""
+        finished = finishedJobs(self.path)
+        results = loadStream(os.path.join(self.path, "runs"))
+        for objType, frame in results["variables"].items():
+            frame = frame[frame.index.get_level_values("sample_id").isin(finished)]
+            results["variables"][objType] = frame.sort_index()
+        if "reporters" in results:
+            reporters = results["reporters"]
+            results["reporters"] = reporters[
+                reporters.index.isin(finished)
+            ].sort_index()
+        jobs = [self.jobs[jobId] for jobId in sorted(finished)]
+        sample = pd.DataFrame(
+            [job["parameters"] for job in jobs],
+            index=pd.Index([job["id"] for job in jobs], name="sample_id"),
+        )
+        varying = [key for key in sample if sample[key].astype(str).nunique() > 1]
+        results["parameters"] = ap.DataDict(
+            constants=sample.drop(columns=varying).iloc[0].to_dict()
+            if len(sample)
+            else {},
+            sample=sample[varying],
+        )
+        return results
+
+
+def runningSweep(
+    grid: dict,
+    path: str = os.path.join("results", "sweep"),
+    params: dict = parameters,
+    workers: int | None = None,
+    model: ap.Model = ASM,
+) -> ap.DataDict:
+    """running or resuming a parameter sweep and returning its merged results"""
+    sweep = Sweep(path, jobs=sweepJobs(params, grid))
+    sweep.run(workers=workers, model=model)
+    return sweep.merge()
+
+
+if __name__ == "__main__":
+    # joining the sweep at the given path from another host of the shared filesystem
+    Sweep(sys.argv[1]).run()
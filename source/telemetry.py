@@ -0,0 +1,163 @@
+import numpy as np
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+TELEMETRY = [
+    "price",
+    "dividend",
+    "aggregatedVolume",
+    "avgBitsUsed",
+]  # model variables kept in the ring buffer of the telemetry
+
+
+class TelemetryBuffer:
+    """ring buffer of the recent values of the telemetry variables without locks
+
+    The step loop is the only writer: it fills the row of the next sequence number
+    and publishes it by incrementing `written` afterwards. Readers copy the arrays
+    and keep only the rows which cannot have been overwritten while copying, so
+    writing stays a few array assignments whether clients are connected or not.
+    """
+
+    def __init__(self, size: int, keys: list = TELEMETRY):
+        self.size = size
+        self.keys = keys
+        self.columns = {key: np.full(size, np.nan) for key in ["t", "time"] + keys}
+        self.written = 0  # number of published rows
+
+    def push(self, t: int, values: list) -> None:
+        """writing the values of a step in the order of the keys"""
+        row = self.written % self.size
+        self.columns["t"][row] = t
+        self.columns["time"][row] = time.perf_counter()
+        for key, value in zip(self.keys, values):
+            self.columns[key][row] = value
+        self.written += 1
+
+    def snapshot(self, last: int | None = None) -> dict:
+        """returning the consistent recent rows in the order of the steps"""
+        before = self.written
+        columns = {key: column.copy() for key, column in self.columns.items()}
+        after = self.written
+        # rows up to the one being written after the copy may have been overwritten meanwhile
+        first = max(after - self.size + 1, 0)
+        if last is not None:
+            first = max(first, before - last)
+        rows = np.arange(first, before) % self.size
+        return {key: column[rows] for key, column in columns.items()}
+
+
+def summary(rows: dict) -> dict:
+    """returning the latest values, the steps per second over the rows, and the rows as lists"""
+    if not len(rows["t"]):
+        return {"t": None, "stepsPerSecond": None, "latest": {}, "series": {}}
+    seconds = rows["time"][-1] - rows["time"][0]
+    return {
+        "t": int(rows["t"][-1]),
+        "stepsPerSecond": (rows["t"][-1] - rows["t"][0]) / seconds
+        if seconds > 0
+        else None,
+        "latest": {
+            key: plain(column[-1]) for key, column in rows.items() if key != "time"
+        },
+        "series": {
+            key: [plain(value) for value in column]
+            for key, column in rows.items()
+            if key != "time"
+        },
+    }
+
+
+def plain(value: float) -> float | None:
+    """returning a value as plain float or None for missing values, which JSON lacks"""
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class TelemetryServer:
+    """local HTTP endpoint serving a telemetry buffer from an asyncio server on a background thread
+
+    The address is "host:port" for TCP, port 0 picking a free port, or the path of
+    a Unix socket. GET requests are answered with the JSON summary of the buffer,
+    limited to the last n rows with ?last=n.
+    """
+
+    def __init__(self, buffer: TelemetryBuffer, address: str, run: str = "run"):
+        self.buffer = buffer
+        self.run = run
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            self.startServer(address), self.loop
+        ).result()
+
+    async def startServer(self, address: str) -> asyncio.AbstractServer:
+        """starting to serve on a Unix socket path or a TCP host and port"""
+        if ":" not in address:
+            if os.path.exists(address):
+                os.remove(address)  # socket left by a previous run
+            self.path = self.address = address
+            return await asyncio.start_unix_server(self.handle, path=address)
+        self.path = None
+        host, port = address.rsplit(":", 1)
+        server = await asyncio.start_server(self.handle, host=host, port=int(port))
+        self.address = f"{host}:{server.sockets[0].getsockname()[1]}"  # with the port picked for port 0
+        return server
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """answering a single HTTP request with the current telemetry"""
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in [b"\r\n", b"\n", b""]:
+                pass  # skipping the headers
+            target = (
+                request.decode("latin-1").split(" ")[1]
+                if request.count(b" ") >= 2
+                else "/"
+            )
+            last = parse_qs(urlsplit(target).query).get("last", [None])[0]
+            body = json.dumps(
+                dict(
+                    run=self.run,
+                    **summary(self.buffer.snapshot(int(last) if last else None)),
+                )
+            ).encode()
+            status = b"200 OK"
+        except ValueError as error:
+            body, status = (
+                json.dumps({"error": str(error)}).encode(),
+                b"400 Bad Request",
+            )
+        writer.write(
+            b"HTTP/1.1 "
+            + status
+            + b"\r\nContent-Type: application/json\r\n"
+            + b"Content-Length: "
+            + str(len(body)).encode()
+            + b"\r\nConnection: close\r\n\r\n"
+            + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def stopServer(self) -> None:
+        """closing the server"""
+        self.server.close()
+        await self.server.wait_closed()
+
+    def close(self) -> None:
+        """stopping the server and its event loop and removing the Unix socket"""
+        asyncio.run_coroutine_threadsafe(self.stopServer(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
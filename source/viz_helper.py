@@ -1,19 +1,149 @@
 import matplotlib.pyplot as plt
 import seaborn as sns
+import numpy as np
 import pandas as pd
 
+POINTS = 2000  # default number of plotted points, roughly the pixel width of a figure
 
-def lineplot(data: pd.Series) -> plt.Figure:
-    """Plot a lineplot of the data."""
+
+def buckets(length: int, count: int) -> np.ndarray:
+    """Return the bucket of each position when splitting the positions into count buckets."""
+    return (np.arange(length) * count) // length
+
+
+def minMaxDownsample(data: pd.Series, points: int = POINTS) -> pd.Series:
+    """Downsample the data to the minimum and maximum of each of points / 2 buckets."""
+    data = data.dropna()
+    if len(data) <= points:
+        return data
+    groups = pd.Series(data.to_numpy()).groupby(buckets(len(data), points // 2))
+    positions = np.union1d(groups.idxmin().to_numpy(), groups.idxmax().to_numpy())
+    return data.iloc[positions]
+
+
+def lttb(data: pd.Series, points: int = POINTS) -> pd.Series:
+    """Downsample the data with the largest triangle three buckets algorithm keeping its shape."""
+    data = data.dropna()
+    length = len(data)
+    if length <= points or points < 3:
+        return data
+    y = data.to_numpy(dtype=float)
+    edges = np.linspace(1, length - 1, points - 1).astype(
+        int
+    )  # points - 2 buckets between the ends
+    selected = np.zeros(points, dtype=int)
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        nextStart = stop
+        nextStop = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        nextX = (nextStart + nextStop - 1) / 2
+        nextY = y[nextStart:nextStop].mean()
+        a = selected[bucket]
+        x = np.arange(start, stop)
+        areas = np.abs((a - nextX) * (y[start:stop] - y[a]) - (a - x) * (nextY - y[a]))
+        selected[bucket + 1] = start + np.argmax(areas)
+    selected[-1] = length - 1
+    return data.iloc[selected]
+
+
+def downsample(
+    data: pd.Series, points: int = POINTS, method: str = "minmax"
+) -> pd.Series:
+    """Downsample the data with the min/max per bucket or the LTTB method."""
+    if method == "lttb":
+        return lttb(data, points)
+    return minMaxDownsample(data, points)
+
+
+def bandDownsample(
+    lower: pd.Series, upper: pd.Series, points: int = POINTS
+) -> pd.DataFrame:
+    """Downsample a band to the envelope of its lower and upper bound in each of points buckets."""
+    band = pd.DataFrame({"lower": lower, "upper": upper}).dropna()
+    if len(band) <= points:
+        return band
+    bucket = buckets(len(band), points)
+    envelope = band.groupby(bucket).agg({"lower": "min", "upper": "max"})
+    envelope.index = band.index[np.searchsorted(bucket, envelope.index)]
+    return envelope
+
+
+def rollingBand(data: pd.Series, window: int, width: float = 1.0) -> pd.DataFrame:
+    """Return the rolling mean of the data and the band of width rolling standard deviations around it."""
+    rolling = data.rolling(window, min_periods=1)
+    mean, std = rolling.mean(), rolling.std().fillna(0)
+    return pd.DataFrame(
+        {"mean": mean, "lower": mean - width * std, "upper": mean + width * std}
+    )
+
+
+def lineplot(
+    data: pd.Series, points: int = POINTS, method: str = "minmax"
+) -> plt.Figure:
+    """Plot a lineplot of the data, downsampled to points if it is longer."""
     fig, ax = plt.subplots()
-    data.plot(ax=ax, alpha=0.5, marker="o", markersize=2, linestyle="-")
+    if len(data) > points:
+        downsample(data, points, method).plot(ax=ax, alpha=0.5, linestyle="-")
+    else:
+        data.plot(ax=ax, alpha=0.5, marker="o", markersize=2, linestyle="-")
     return fig
 
 
-def errLineplot(data: pd.DataFrame, y: str, err: str) -> plt.Figure:
+def errLineplot(
+    data: pd.DataFrame, y: str, err: str, points: int = POINTS
+) -> plt.Figure:
     """Plot a lineplot of the data with error bars."""
-    fig = lineplot(data=data[y])
-    plt.fill_between(
-        data.index.to_list(), data[y] - data[err], data[y] + data[err], alpha=0.5
+    fig = lineplot(data=data[y], points=points)
+    band = bandDownsample(data[y] - data[err], data[y] + data[err], points)
+    plt.fill_between(band.index.to_list(), band["lower"], band["upper"], alpha=0.5)
+    return fig
+
+
+def bandLineplot(
+    data: pd.Series, window: int, width: float = 1.0, points: int = POINTS
+) -> plt.Figure:
+    """Plot the rolling mean of the data with a band of rolling standard deviations."""
+    band = rollingBand(data, window, width)
+    return errLineplot(
+        band.assign(err=(band["upper"] - band["lower"]) / 2),
+        y="mean",
+        err="err",
+        points=points,
     )
+
+
+def fanplot(
+    data: pd.Series | pd.DataFrame,
+    quantiles: tuple = (0.05, 0.25, 0.5, 0.75, 0.95),
+    points: int = POINTS,
+) -> plt.Figure:
+    """Plot an ensemble of runs as median line and fans between symmetric quantiles.
+
+    The data is a series indexed by run and time step "t", e.g. a recorded variable of
+    an experiment, or a frame of time steps by runs. Only the downsampled quantiles are
+    passed to matplotlib, never the single runs.
+    """
+    if isinstance(data, pd.DataFrame):
+        fan = data.quantile(list(quantiles), axis=1).T
+    else:
+        fan = data.groupby(level="t").quantile(list(quantiles)).unstack()
+    fig, ax = plt.subplots()
+    colors = sns.color_palette()
+    for lower, upper in zip(quantiles[: len(quantiles) // 2], quantiles[::-1]):
+        band = bandDownsample(fan[lower], fan[upper], points)
+        ax.fill_between(
+            band.index.to_list(),
+            band["lower"],
+            band["upper"],
+            alpha=0.25,
+            color=colors[0],
+            linewidth=0,
+            label=f"{lower:.0%}-{upper:.0%}",
+        )
+    if len(quantiles) % 2:
+        median = quantiles[len(quantiles) // 2]
+        downsample(fan[median], points).plot(
+            ax=ax, color=colors[0], label=f"{median:.0%}"
+        )
+    ax.legend()
     return fig
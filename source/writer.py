@@ -0,0 +1,175 @@
+from recorder import modelFrame, agentFrame, addIndexColumns
+
+import agentpy as ap
+import numpy as np
+import pandas as pd
+import glob
+import json
+import os
+import queue
+import shutil
+import threading
+
+TYPES = {
+    "model": "ArtificialStockMarket",
+    "agents": "MarketStatistician",
+}  # object types of the tables in the output
+QUEUED = (
+    4  # chunks per column queued for writing before the simulation waits for the disk
+)
+
+
+class ChunkWriter:
+    """background writer streaming the recorded chunks of a run to a directory
+
+    Every chunk is written by a separate thread as <path>/<table>/<key>/<chunk>.npz
+    holding the arrays t and values, so the simulation only waits for the disk once
+    QUEUED chunks per column are queued and never buffers the whole run in memory.
+    The agent ids are kept in <path>/agents/obj_id.npy and the index columns, keys,
+    and final objects like rules and reporters in <path>/meta.json.
+    """
+
+    def __init__(self, path: str, chunk: int = 1000, columns: dict | None = None):
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        self.path = path
+        self.chunk = chunk  # rows per written chunk
+        self.meta = {"columns": columns or {}, "types": TYPES}
+        self.writeMeta()
+        self.chunks = {}  # number of chunks handed over per table and key
+        self.queue = queue.Queue(maxsize=QUEUED)  # growing by QUEUED chunks per column
+        self.error = None
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def sink(self, table: str, key: str):
+        """returning a function handing the chunks of a column to the writer thread"""
+        with self.queue.mutex:
+            self.queue.maxsize += QUEUED
+
+        def write(times: np.ndarray, values: np.ndarray):
+            index = self.chunks.get((table, key), 0)
+            self.chunks[(table, key)] = index + 1
+            self.queue.put(
+                (
+                    os.path.join(self.path, table, key, f"{index:06d}.npz"),
+                    {"t": times, "values": values},
+                )
+            )
+
+        return write
+
+    def writeArray(self, table: str, key: str, values: np.ndarray):
+        """writing a single array of a table in the writer thread"""
+        self.queue.put((os.path.join(self.path, table, f"{key}.npy"), values))
+
+    def work(self):
+        """writing queued arrays until the writer is closed"""
+        while (item := self.queue.get()) is not None:
+            filePath, arrays = item
+            try:
+                os.makedirs(os.path.dirname(filePath), exist_ok=True)
+                # writing to a temporary file first, so a crash never leaves a partial chunk
+                with open(filePath + ".tmp", "wb") as file:
+                    if isinstance(arrays, dict):
+                        np.savez(file, **arrays)
+                    else:
+                        np.save(file, arrays)
+                os.replace(filePath + ".tmp", filePath)
+            except Exception as error:
+                self.error = error
+
+    def close(self, keys: dict, **objects):
+        """waiting for all chunks to be written and saving keys and final objects"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        self.meta.update(keys=keys, **objects)
+        self.writeMeta()
+
+    def writeMeta(self):
+        """writing the meta data of the run"""
+        with open(os.path.join(self.path, "meta.json"), "w") as file:
+            json.dump(self.meta, file, default=str)
+
+    def series(self, table: str) -> dict:
+        """returning the written (times, values) of all variables of a table"""
+        return readSeries(self.path, table, self.meta.get("keys", {}).get(table))
+
+    def readArray(self, table: str, key: str) -> np.ndarray:
+        """reading a single array of a table"""
+        return np.load(os.path.join(self.path, table, f"{key}.npy"))
+
+
+def readSeries(path: str, table: str, keys: list | None = None) -> dict:
+    """reading the chunks of all variables of a table, keys default to all written variables"""
+    if keys is None:
+        keys = sorted(os.listdir(os.path.join(path, table)))
+        keys = [key for key in keys if os.path.isdir(os.path.join(path, table, key))]
+    series = {}
+    for key in keys:
+        chunks = [
+            np.load(chunkPath)
+            for chunkPath in sorted(glob.glob(os.path.join(path, table, key, "*.npz")))
+        ]
+        if chunks:
+            series[key] = (
+                np.concatenate([chunk["t"] for chunk in chunks]),
+                np.concatenate([chunk["values"] for chunk in chunks]),
+            )
+    return series
+
+
+def loadStream(path: str) -> ap.DataDict:
+    """loading the streamed results of a run or all runs in a directory as agentpy DataDict
+
+    Runs which did not finish, e.g. after a crash, are loaded up to their last
+    written chunk.
+    """
+    runs = sorted(glob.glob(os.path.join(path, "run*", "meta.json")))
+    runs = [os.path.dirname(run) for run in runs] or [path]
+    variables, reporters, parameters = {}, [], None
+    for run in runs:
+        with open(os.path.join(run, "meta.json")) as file:
+            meta = json.load(file)
+        columns, types, keys = meta["columns"], meta["types"], meta.get("keys", {})
+        frames = {
+            types["model"]: modelFrame(readSeries(run, "model", keys.get("model")))
+        }
+        if os.path.exists(os.path.join(run, "agents", "obj_id.npy")):
+            frame = agentFrame(
+                readSeries(run, "agents", keys.get("agents")),
+                np.load(os.path.join(run, "agents", "obj_id.npy")),
+            )
+            if "rules" in meta:
+                # rules of each agent at the last time step
+                frame = frame.join(
+                    pd.Series(
+                        list(meta["rules"].values()),
+                        index=pd.MultiIndex.from_tuples(
+                            [(int(objId), meta["t"]) for objId in meta["rules"]],
+                            names=["obj_id", "t"],
+                        ),
+                        name="rules",
+                    ),
+                    how="outer",
+                )
+            frames[types["agents"]] = frame
+        for objType, frame in frames.items():
+            variables.setdefault(objType, []).append(addIndexColumns(frame, columns))
+        if "reporters" in meta:
+            frame = pd.DataFrame(
+                {key: [value] for key, value in (meta["reporters"] | columns).items()}
+            )
+            reporters.append(frame.set_index(list(columns)) if columns else frame)
+        parameters = meta.get("parameters", parameters)
+    results = ap.DataDict()
+    results["variables"] = ap.DataDict(
+        {objType: pd.concat(frames) for objType, frames in variables.items()}
+    )
+    if reporters:
+        results["reporters"] = pd.concat(reporters)
+    if parameters is not None:
+        results["parameters"] = ap.DataDict(constants=parameters)
+    return results
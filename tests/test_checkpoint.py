@@ -0,0 +1,40 @@
+from model_params import parameters
+from model import ArtificialStockMarket as ASM
+
+import numpy as np
+import pytest
+
+STEPS, SPLIT = (
+    300,
+    140,
+)  # steps of the uninterrupted run and of the first part of the split run
+
+
+@pytest.mark.parametrize("engine", ["agents", "population"])
+@pytest.mark.parametrize("rng", ["legacy", "philox"])
+def test_split_run_equals_uninterrupted_run(tmp_path, rng, engine):
+    base = dict(parameters) | {
+        "rng": rng,
+        "engine": engine,
+        "mode": 0,
+        "streamPath": None,
+        "checkpointPath": None,
+    }
+    full = ASM(base | {"steps": STEPS}).run(display=False)
+    ASM(base | {"steps": SPLIT, "checkpointPath": str(tmp_path)}).run(display=False)
+    # the second part resumes with the bumped seed of runningSplitExperiment
+    resumed = ASM(
+        base
+        | {
+            "steps": STEPS - SPLIT,
+            "mode": 3,
+            "importPath": str(tmp_path),
+            "seed": base["seed"] + 1,
+        }
+    ).run(display=False)
+    full = full["variables"]["ArtificialStockMarket"]
+    resumed = resumed["variables"]["ArtificialStockMarket"]
+    for key in ["price", "dividend", "avgBitsUsed"]:
+        np.testing.assert_array_equal(
+            resumed[key].values[1:], full[key].values[SPLIT + 1 :]
+        )
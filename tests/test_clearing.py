@@ -0,0 +1,33 @@
+from model_params import parameters
+from clearing import clearingPrice
+
+import agentpy as ap
+import numpy as np
+import pytest
+
+P = ap.AttrDict(parameters)
+
+
+def clearEqualAgents(alpha: float, beta: float, cash: float, price: float) -> float:
+    """returning the clearing price of three equal agents holding one share each"""
+    ones = np.ones(3)
+    return clearingPrice(alpha * ones, beta * ones, ones, cash * ones, P, price)
+
+
+@pytest.mark.parametrize("price", [P.minPrice, 80, P.maxPrice])
+def test_excess_demand_clears_at_max_price(price):
+    # the maximum bid is limited by the cash only at high prices, leaving excess demand
+    assert clearEqualAgents(20, 0, 5000, price) == P.maxPrice
+
+
+@pytest.mark.parametrize("price", [P.minPrice, 80, P.maxPrice])
+def test_excess_supply_clears_at_min_price(price):
+    # the demand falls with the price and stays below the shares at all prices
+    assert clearEqualAgents(0.9, -0.001, 1e6, price) == P.minPrice
+
+
+def test_interior_clearing_price():
+    price = clearEqualAgents(
+        2, -0.01, 1e6, 80
+    )  # demand 2 - 0.01 * price equals one share
+    assert price == pytest.approx(100)
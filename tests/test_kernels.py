@@ -0,0 +1,54 @@
+from model_params import parameters
+from model import ArtificialStockMarket as ASM
+import kernels
+
+import pandas as pd
+import pytest
+
+STEPS = 300  # long enough for the genetic algorithm to replace rules of all agents
+
+
+def runPopulation(kernelsEnabled: bool, **params) -> dict:
+    """running the population engine and returning its model and agent variables"""
+    p = dict(parameters) | {
+        "mode": 0,
+        "engine": "population",
+        "steps": STEPS,
+        "kernels": kernelsEnabled,
+        "streamPath": None,
+        "checkpointPath": None,
+    }
+    results = ASM(p | params).run(display=False)
+    return results["variables"]
+
+
+@pytest.fixture(autouse=True)
+def runKernels(monkeypatch):
+    """running the kernels as plain Python functions if Numba is not installed"""
+    monkeypatch.setattr(kernels, "COMPILED", True)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"ruleCache": False},
+        {"forecastAdaptation": 1, "ruleCache": False},
+        {"defaultPredictor": "separate"},
+    ],
+)
+def test_kernels_equal_numpy_procedures(params):
+    compiled = runPopulation(True, **params)
+    procedures = runPopulation(False, **params)
+    model, expected = (
+        compiled["ArtificialStockMarket"],
+        procedures["ArtificialStockMarket"],
+    )
+    for key in ["price", "dividend"]:
+        pd.testing.assert_series_equal(model[key], expected[key], check_exact=True)
+    pd.testing.assert_frame_equal(model, expected, check_exact=True)
+    pd.testing.assert_frame_equal(
+        compiled["MarketStatistician"],
+        procedures["MarketStatistician"],
+        check_exact=True,
+    )
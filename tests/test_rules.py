@@ -0,0 +1,29 @@
+from rules import MatchCache, CACHEROWS
+
+import numpy as np
+
+
+def test_match_cache_stays_bounded_and_exact():
+    rng = np.random.default_rng(0)
+    care = rng.integers(1 << 12, size=(5, 11))
+    value = rng.integers(1 << 12, size=(5, 11))
+    live = rng.random((5, 11)) < 0.9
+    cache = MatchCache(care, value, live)
+    for step in range(2000):
+        worldMask = int(rng.integers(4 * CACHEROWS))  # more world states than cached
+        if step % 7 == 0:
+            # changing a condition like the genetic algorithm
+            index = (int(rng.integers(5)), int(rng.integers(10)))
+            care[index] = rng.integers(1 << 12)
+            cache.changed(index)
+        np.testing.assert_array_equal(cache.lookup(worldMask), cache.match(worldMask))
+        assert len(cache.rows) <= CACHEROWS and len(cache.masks) <= CACHEROWS
+    assert cache.hits and cache.misses
+
+
+def test_match_cache_capacity_follows_memory():
+    shape = (10000, 1001)  # about 10 MB of matches per world state
+    cache = MatchCache(
+        *(np.zeros(shape, dtype=np.int16) for _ in range(2)), np.ones(shape, bool)
+    )
+    assert cache.capacity == 6
@@ -0,0 +1,65 @@
+from running_stats import RollingMean, RunningVariance
+
+import numpy as np
+import pytest
+
+WINDOWS = [
+    5,
+    10,
+    100,
+    500,
+]  # periods of the moving averages of the technical conditions
+
+
+def randomWalk(steps: int, seed: int) -> np.ndarray:
+    """returning a random walk of the price starting at the initial price"""
+    rng = np.random.default_rng(seed)
+    return 80 + np.cumsum(rng.normal(0, 1, steps))
+
+
+def clampedWalk(steps: int, seed: int) -> np.ndarray:
+    """returning a random walk running into the minimum and maximum price and staying there"""
+    rng = np.random.default_rng(seed)
+    return np.clip(80 + np.cumsum(rng.normal(0, 20, steps)), 0.01, 500)
+
+
+SERIES = {
+    "random": randomWalk(50000, seed=1),
+    "volatile": randomWalk(50000, seed=2) * 1e3,
+    "constant": np.full(5000, 80.123456789),
+    "clamped": clampedWalk(20000, seed=3),
+}
+
+
+@pytest.mark.parametrize("name", list(SERIES))
+def test_rolling_mean_equals_average_of_window(name):
+    series = SERIES[name]
+    movingAverages = {periods: RollingMean(periods) for periods in WINDOWS}
+    for t, price in enumerate(series):
+        for periods, movingAverage in movingAverages.items():
+            movingAverage.push(price)
+            expected = np.average(series[max(t + 1 - periods, 0) : t + 1])
+            assert movingAverage.mean == expected
+            # technical condition of the world state, also for values next to the mean
+            for value in [
+                price,
+                np.nextafter(expected, -np.inf),
+                np.nextafter(expected, np.inf),
+            ]:
+                assert movingAverage.below(value) == (value > expected)
+
+
+@pytest.mark.parametrize("name", list(SERIES))
+def test_running_variance_matches_variance_of_series(name):
+    series = SERIES[name]
+    variance = RunningVariance()
+    for t, value in enumerate(series):
+        variance.push(value)
+        if t % 97 == 0 or t == len(series) - 1:
+            expected = np.var(series[: t + 1])
+            assert variance.variance == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+def test_empty_statistics_are_nan():
+    assert np.isnan(RollingMean(5).mean)
+    assert np.isnan(RunningVariance().variance)